@@ -0,0 +1,56 @@
+# =============================================================================
+# Copyright (c) 2024 Martin F N Cooper
+#
+# Author: Martin F N Cooper
+# License: MIT License
+# =============================================================================
+
+"""
+Throughput of writing and reading capture files, in both formats.
+"""
+
+import pytest
+
+import kiss.capture
+from conftest import make_stream
+
+
+def _write_capture(path, payloads):
+    with kiss.capture.CaptureWriter(path) as writer:
+        for (i, data) in enumerate(payloads):
+            writer.write(0, data, 1000.0 + i)
+
+
+@pytest.mark.benchmark(group='capture')
+def bench_capture_write(benchmark, payloads, tmp_path):
+    path = tmp_path / 'bench.kcap'
+
+    def run():
+        if path.exists():
+            path.unlink()
+        _write_capture(str(path), payloads)
+    benchmark(run)
+
+
+@pytest.mark.benchmark(group='capture')
+def bench_capture_read(benchmark, payloads, tmp_path):
+    path = str(tmp_path / 'bench.kcap')
+    _write_capture(path, payloads)
+
+    def run():
+        with kiss.capture.CaptureReader(path) as reader:
+            for _ in reader:
+                pass
+    benchmark(run)
+
+
+@pytest.mark.benchmark(group='capture')
+def bench_raw_read(benchmark, payloads, tmp_path):
+    path = tmp_path / 'bench.kiss'
+    path.write_bytes(make_stream(payloads))
+
+    def run():
+        with kiss.capture.RawReader(str(path)) as reader:
+            for _ in reader:
+                pass
+    benchmark(run)
@@ -0,0 +1,49 @@
+# =============================================================================
+# Copyright (c) 2024 Martin F N Cooper
+#
+# Author: Martin F N Cooper
+# License: MIT License
+# =============================================================================
+
+"""
+Throughput of KISS escaping and unescaping, for each payload mix. Each round
+processes the entire mix, so throughput is the mix size divided by the time.
+"""
+
+import pytest
+
+from kiss import codec
+
+
+@pytest.mark.benchmark(group='encode')
+def bench_encode(benchmark, payloads):
+    encode = codec.encode
+
+    def run():
+        for data in payloads:
+            encode(data)
+    benchmark(run)
+    benchmark.extra_info['bytes'] = sum(len(p) for p in payloads)
+
+
+@pytest.mark.benchmark(group='decode')
+def bench_decode(benchmark, payloads):
+    decode = codec.decode
+    encoded = [codec.encode(data) for data in payloads]
+
+    def run():
+        for data in encoded:
+            decode(data)
+    benchmark(run)
+    benchmark.extra_info['bytes'] = sum(len(p) for p in encoded)
+
+
+@pytest.mark.benchmark(group='build_frame')
+def bench_build_frame(benchmark, payloads):
+    # Complete frame construction, as on the send path
+    from kiss import Command, _build_frame
+
+    def run():
+        for data in payloads:
+            _build_frame(0, Command.DATA_FRAME, data)
+    benchmark(run)
@@ -0,0 +1,76 @@
+# =============================================================================
+# Copyright (c) 2024 Martin F N Cooper
+#
+# Author: Martin F N Cooper
+# License: MIT License
+# =============================================================================
+
+"""
+Throughput of splitting a received byte stream into frames, with the stream
+arriving in chunks of various sizes, as from successive socket reads.
+"""
+
+import pytest
+
+import kiss
+import kiss.bulk
+from conftest import MIXES, make_stream
+
+_CHUNK_SIZES = (64, 512, 4096, 65536)
+
+
+def _chunks(stream, size):
+    return [stream[i:i + size] for i in range(0, len(stream), size)]
+
+
+@pytest.mark.benchmark(group='deframe')
+@pytest.mark.parametrize('chunk_size', _CHUNK_SIZES)
+def bench_deframe(benchmark, payloads, chunk_size):
+    chunks = _chunks(make_stream(payloads), chunk_size)
+
+    def run():
+        deframer = kiss._Deframer()
+        for chunk in chunks:
+            deframer.feed(chunk)
+    benchmark(run)
+
+
+@pytest.mark.benchmark(group='deframe_long')
+@pytest.mark.parametrize('chunk_size', _CHUNK_SIZES)
+def bench_deframe_long_frame(benchmark, chunk_size):
+    # A single long frame arriving across many reads
+    chunks = _chunks(make_stream([b'x' * (1 << 20)]), chunk_size)
+
+    def run():
+        deframer = kiss._Deframer()
+        for chunk in chunks:
+            deframer.feed(chunk)
+    benchmark(run)
+
+
+@pytest.mark.benchmark(group='receive')
+@pytest.mark.parametrize('chunk_size', _CHUNK_SIZES)
+def bench_receive_decode(benchmark, chunk_size):
+    # Deframing, parsing and decoding together, as on the receive path
+    chunks = _chunks(make_stream(MIXES['aprs']), chunk_size)
+
+    def run():
+        decoder = kiss.Decoder()
+        for chunk in chunks:
+            for _ in decoder.feed(chunk):
+                pass
+    benchmark(run)
+
+
+@pytest.mark.benchmark(group='bulk')
+@pytest.mark.parametrize('implementation', ['python', 'numpy'])
+def bench_bulk_decode(benchmark, payloads, implementation):
+    # Decoding a whole capture at once, with and without NumPy
+    if implementation == 'numpy':
+        if kiss.bulk.numpy is None:
+            pytest.skip('NumPy is not installed')
+        decode = kiss.bulk._decode_numpy
+    else:
+        decode = kiss.bulk._decode_python
+    stream = make_stream(payloads) * 10
+    benchmark(decode, stream, False)
@@ -0,0 +1,124 @@
+# =============================================================================
+# Copyright (c) 2024 Martin F N Cooper
+#
+# Author: Martin F N Cooper
+# License: MIT License
+# =============================================================================
+
+"""
+End-to-end performance of a Connection talking to a loopback fake TNC.
+Throughput is measured in frames per second for a burst of frames, either
+echoed back by the TNC or generated by it; latency is measured per frame,
+with percentiles recorded in the benchmark's extra info.
+"""
+
+import threading
+import time
+
+import pytest
+
+import kiss
+from kiss.testing import FakeTnc, Mode
+from conftest import MIXES
+
+_BURST = 1000  # Frames per throughput round
+_PINGS = 2000  # Frames for latency measurement
+
+
+def _mean_time(benchmark):
+    # None when benchmarking is disabled, e.g. for a quick smoke test
+    stats = benchmark.stats
+    return stats.stats.mean if stats and stats.stats.mean else None
+
+
+def _percentile(samples, q):
+    # Nearest-rank percentile, since statistics.quantiles needs Python 3.8
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+
+class _Counter:
+    def __init__(self):
+        self.count = 0
+        self.target = 0
+        self.done = threading.Event()
+
+    def expect(self, count):
+        self.count = 0
+        self.target = count
+        self.done.clear()
+
+    def __call__(self, port, data):
+        self.count += 1
+        if self.count == self.target:
+            self.done.set()
+
+
+@pytest.fixture
+def loopback():
+    with FakeTnc(Mode.ECHO) as tnc:
+        counter = _Counter()
+        connection = kiss.Connection(counter)
+        connection.connect_to_server(*tnc.address)
+        yield (connection, counter)
+        connection.disconnect_from_server()
+
+
+@pytest.mark.benchmark(group='socket_throughput')
+@pytest.mark.parametrize('batched', [False, True])
+def bench_throughput(benchmark, loopback, batched):
+    (connection, counter) = loopback
+    payloads = MIXES['aprs'][:_BURST]
+
+    def run():
+        counter.expect(len(payloads))
+        if batched:
+            connection.send_many(payloads)
+        else:
+            for data in payloads:
+                connection.send_data(data)
+        if not counter.done.wait(10):
+            raise RuntimeError('Frames not echoed')
+    benchmark(run)
+    mean = _mean_time(benchmark)
+    if mean:
+        benchmark.extra_info['frames_per_second'] = len(payloads) / mean
+
+
+@pytest.mark.benchmark(group='socket_latency')
+def bench_latency(benchmark, loopback):
+    (connection, counter) = loopback
+    payload = MIXES['aprs'][0]
+    samples = []
+
+    def ping():
+        counter.expect(1)
+        start = time.perf_counter()
+        connection.send_data(payload)
+        if not counter.done.wait(10):
+            raise RuntimeError('Frame not echoed')
+        samples.append(time.perf_counter() - start)
+    benchmark.pedantic(ping, rounds=_PINGS, warmup_rounds=100)
+    if samples:
+        benchmark.extra_info['p50_us'] = _percentile(samples, 50) * 1e6
+        benchmark.extra_info['p99_us'] = _percentile(samples, 99) * 1e6
+
+
+@pytest.mark.benchmark(group='socket_receive')
+@pytest.mark.parametrize('fragment', [None, (1, 64), (512, 4096)])
+def bench_receive(benchmark, fragment):
+    # Frames generated by the TNC, optionally written in random fragments
+    counter = _Counter()
+    connection = kiss.Connection(counter)
+
+    def run():
+        with FakeTnc(Mode.GENERATE, count=_BURST, fragment=fragment) as tnc:
+            counter.expect(_BURST)
+            connection.connect_to_server(*tnc.address)
+            if not counter.done.wait(10):
+                raise RuntimeError('Frames not received')
+            connection.disconnect_from_server()
+    benchmark(run)
+    mean = _mean_time(benchmark)
+    if mean:
+        benchmark.extra_info['frames_per_second'] = _BURST / mean
@@ -0,0 +1,76 @@
+# =============================================================================
+# Copyright (c) 2024 Martin F N Cooper
+#
+# Author: Martin F N Cooper
+# License: MIT License
+# =============================================================================
+
+"""
+Shared payloads for the benchmarks.
+
+All payloads are generated from a fixed seed, so that every run, on every
+commit, measures exactly the same data.
+"""
+
+import random
+
+import pytest
+
+import kiss
+
+_SEED = 73
+_MIX_SIZE = 1000  # Number of payloads in each mix
+
+
+def _address(rng, last):
+    # AX.25 address: six shifted callsign characters, then the SSID byte
+    call = [rng.choice(b'ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789 ') << 1
+            for _ in range(6)]
+    return bytes(call + [0x60 | rng.randrange(16) << 1 | last])
+
+
+def _aprs_payload(rng):
+    # A UI frame with an APRS position report, and up to two digipeaters
+    digis = rng.randrange(3)
+    header = _address(rng, 0) + _address(rng, 0 if digis else 1)
+    for i in range(digis):
+        header += _address(rng, 1 if i == digis - 1 else 0)
+    info = '!{:04d}.{:02d}N/{:05d}.{:02d}W-{}'.format(
+        rng.randrange(9000), rng.randrange(100), rng.randrange(18000),
+        rng.randrange(100), 'x' * rng.randrange(10, 60))
+    return header + b'\x03\xF0' + info.encode('ascii')
+
+
+def _binary_payload(rng):
+    return bytes(rng.randrange(256) for _ in range(rng.randrange(20, 256)))
+
+
+def _make_mixes():
+    rng = random.Random(_SEED)
+    return {
+        'aprs': [_aprs_payload(rng) for _ in range(_MIX_SIZE)],
+        'binary': [_binary_payload(rng) for _ in range(_MIX_SIZE)],
+        'all_fend': [kiss.FEND * 256] * _MIX_SIZE,
+        'all_fesc': [kiss.FESC * 256] * _MIX_SIZE
+    }
+
+
+MIXES = _make_mixes()
+
+
+@pytest.fixture(params=sorted(MIXES))
+def payloads(request):
+    """
+    Each payload mix in turn. The mix name is used as the benchmark param.
+    """
+    return MIXES[request.param]
+
+
+def make_stream(payloads, port=0):
+    """
+    Return a KISS byte stream containing a data frame for each payload.
+    """
+    stream = bytearray()
+    for data in payloads:
+        kiss._build_frame(port, kiss.Command.DATA_FRAME, data, stream)
+    return bytes(stream)
@@ -9,9 +9,11 @@
 KISS TNC Protocol Client
 
 A client implementation for the KISS TNC protocol, providing send and receive
-capability via a TCP/IP connection. All commands are supported in sending to
-the TNC; per the spec, only data frames are supported when receiving from the
-TNC. Multi-port TNCs are supported.
+capability via a TCP/IP connection, or via a serial connection or other
+transport. All commands are supported in sending to the TNC. Per the spec,
+a TNC sends only data frames; other frames, such as replies to hardware
+commands or vendor extensions, are dropped unless the application provides a
+handler for them. Multi-port TNCs are supported.
 
 Protocol reference:
   http://www.ka9q.net/papers/kiss.html
@@ -20,40 +22,140 @@ Protocol reference:
 __author__ = 'Martin F N Cooper'
 __version__ = '1.0.0'
 
+import asyncio
+import collections
+import concurrent.futures
+import contextlib
 from enum import Enum
-import errno
+import functools
+import queue
+import random
+import re
+import selectors
 import socket
 import threading
+import time
+import traceback
 
-
-# Special characters
-FEND  = b'\xC0'
-FESC  = b'\xDB'
-TFEND = b'\xDC'
-TFESC = b'\xDD'
-
-# Encoded special characters
-ENC_FEND = b'\xDB\xDC'
-ENC_FESC = b'\xDB\xDD'
+from . import codec
+from .codec import (  # noqa: F401
+    FEND, FESC, TFEND, TFESC, ENC_FEND, ENC_FESC)
+from .stats import MAX_PORTS, Histogram, Stats  # noqa: F401
+from .transport import (  # noqa: F401
+    Transport, TcpTransport, UnixTransport, SerialTransport, PtyTransport,
+    WSAENOTSOCK)
 
 
 DEF_HOST = '127.0.0.1'  # Default host
 DEF_PORT = 8000         # Default port
 
-WSAENOTSOCK = 10038  # Windows error raised when socket is closed
+_BUF_LEN = 4096     # Buffer length for socket i/o
+_MAX_WRITE = 65536  # Maximum number of queued bytes to write at once
+_MAX_SEQ = 0xFFFF   # Largest ACKMODE sequence number
+
+# Bytes that are escaped when encoded, each adding one byte
+_find_special = re.compile(b'[\xC0\xDB]').findall
+
+_DEF_TX_DELAY = 50   # TX delay assumed until set, per the spec (500 ms)
+_HDLC_OVERHEAD = 4   # Bytes added to each frame on air (FCS and flags)
 
+# Commands whose frames are transmitted, and so subject to airtime limits
+_LIMITED_COMMANDS = (0x00, 0x0C)
 
-class KissException():
+
+class KissException(Exception):  # noqa: N818
     @property
     def message(self):
         return self.args[0] if self.args else ''
 
 
+class Overflow(Enum):
+    """
+    Action to take when a frame arrives at a queue that is full.
+    """
+    BLOCK = 'block'
+    """ Wait until there is room in the queue """
+    DROP  = 'drop'
+    """ Discard the frame """
+    RAISE = 'raise'
+    """ Raise a queue.Full exception """
+
+
+class Priority(Enum):
+    """
+    Order in which frames waiting in a scheduled send queue are written.
+    """
+    CONTROL     = 0
+    """ Commands to the TNC, such as setting the TX delay """
+    INTERACTIVE = 1
+    """ Traffic that someone is waiting for, such as connected-mode data """
+    BULK        = 2
+    """ Traffic that can wait, such as beacons """
+
+
+class State(Enum):
+    """
+    Stage in the lifecycle of a connection.
+    """
+    CONNECTING = 'connecting'
+    """ Connecting, or reconnecting after the connection was lost """
+    CONNECTED  = 'connected'
+    """ Connected, and able to send and receive """
+    DRAINING   = 'draining'
+    """ Disconnecting, once any queued frames have been sent """
+    CLOSED     = 'closed'
+    """ Not connected """
+
+
+class Backoff:
+    """
+    Delays between attempts to reconnect to the TNC. The delay doubles (by
+    default) after each failed attempt, up to a maximum. Each delay is
+    shortened by a random fraction of up to ``jitter``, so that many clients
+    that lose their connections at the same moment do not all reconnect at
+    once.
+
+    :param float initial: Delay before the first attempt, in seconds.
+    :param float maximum: Longest delay between attempts, in seconds.
+    :param float factor: Amount by which the delay is multiplied after each
+        failed attempt.
+    :param float jitter: Largest fraction of each delay to be removed at
+        random, in the range 0 - 1.
+    """
+    def __init__(self, initial=0.5, maximum=30.0, factor=2.0, jitter=0.5):
+        if initial <= 0:
+            raise ValueError("Illegal initial value: out of range")
+        if maximum < initial:
+            raise ValueError("Illegal maximum value: less than initial")
+        if factor < 1:
+            raise ValueError("Illegal factor value: out of range")
+        if jitter < 0 or jitter > 1:
+            raise ValueError("Illegal jitter value: out of range")
+        self.initial = initial
+        self.maximum = maximum
+        self.factor = factor
+        self.jitter = jitter
+
+    def delays(self):
+        """
+        Generate the delay before each successive attempt, without end.
+
+        :return: Delays, in seconds.
+        :rtype: iterator of float
+        """
+        delay = self.initial
+        while True:
+            yield delay * (1 - self.jitter * random.random())
+            delay = min(delay * self.factor, self.maximum)
+
+
 class Command(Enum):
     """
-    KISS command values as defined in the spec.
+    KISS command values as defined in the spec, and common extensions.
 
-    These commands are valid only when sending.
+    Except for data frames, these commands are normally only sent, not
+    received. The ACKMODE and POLL extensions are not part of the spec, and
+    are supported only by some TNCs.
     """
     DATA_FRAME   = 0x00
     """ Data frame """
@@ -69,28 +171,240 @@ class Command(Enum):
     """ Set for full duplex, clear for half duplex """
     SET_HARDWARE = 0x06
     """ TNC-specific command """
+    ACKMODE      = 0x0C
+    """ Data frame to be acknowledged once transmitted (extension) """
+    POLL         = 0x0E
+    """ Poll for received frames (extension) """
     RETURN       = 0xFF
     """ Exit KISS mode """
 
 
+class PreparedFrame:
+    """
+    A data frame encoded in advance, ready to be written to the TNC as is.
+    Create one using :meth:`Connection.prepare`.
+
+    :param int port: KISS port number.
+    :param data: Data to be sent.
+    :type data: bytes or bytearray
+    """
+    __slots__ = ('_port', '_data', '_frame')
+
+    def __init__(self, port, data):
+        self._port = port
+        self._data = bytes(data)
+        self._frame = bytes(_build_frame(port, Command.DATA_FRAME, data))
+
+    @property
+    def port(self):
+        """ The KISS port on which the frame is to be sent. """
+        return self._port
+
+    @property
+    def data(self):
+        """ The data, before encoding. """
+        return self._data
+
+    @property
+    def frame(self):
+        """ The complete encoded frame, including FENDs. """
+        return self._frame
+
+
 class Connection:
     """
     A connection to a KISS TNC.
 
     Create an instance of this to communicate with the TNC. The callback
     function will be invoked with each complete KISS frame received from the
-    TNC.
+    TNC. Frames received on particular KISS ports may instead be delivered
+    elsewhere, using :meth:`route`.
+
+    By default, frames are written to the TNC by the thread that sends them.
+    If a send queue size is specified, frames are instead added to a bounded
+    queue, and written to the TNC by a background thread. When the number of
+    queued frames reaches the queue size (the high watermark), the overflow
+    policy is applied to each new frame until the queue has drained down to
+    the low watermark. Commands to the TNC, such as :meth:`set_tx_delay`,
+    are exempt, and are always queued.
+
+    A send queue may instead be scheduled. Queued frames are then written in
+    order of :class:`Priority`, so that TNC commands go first and bulk
+    traffic last, and in turn from each KISS port within each priority, so
+    that a busy port cannot hold up the others. Frames may be given a
+    maximum age, after which they are discarded instead of being written.
+    Scheduling matters only when frames are queued faster than they can be
+    written, e.g. to a slow serial TNC.
+
+    The rate at which data frames are sent on a KISS port may be limited to
+    what the radio channel can carry, using :meth:`limit_airtime`, so that
+    frames do not accumulate in the TNC.
+
+    If a backoff is specified, the connection is resilient: when the TNC
+    connection is lost, it is re-established automatically, in the
+    background, and the most recent TX delay, persistence, slot time, TX tail
+    and full duplex settings for each port are sent to the TNC again. Frames
+    sent while the connection is down are held in a bounded queue, and
+    written all at once when it is restored; the ``send_overflow`` policy
+    applies when this queue is full. Frames received but not yet complete
+    when the connection is lost are discarded.
+
+    If an acknowledgement window is specified, frames may be sent using the
+    ACKMODE extension supported by some TNCs, which report when each such
+    frame has been transmitted. At most ``ack_window`` of these frames may be
+    awaiting acknowledgement at once, keeping the TNC's own queue short; the
+    ``send_overflow`` policy applies to further frames until acknowledgements
+    arrive, or time out.
+
+    The progress of the connection is reflected in its :attr:`state`. A loss
+    of connection is noticed when receiving, or when writing to the TNC
+    fails. Unless the connection is resilient, its state then becomes CLOSED,
+    and :meth:`disconnect_from_server` should still be called to release its
+    resources.
 
     :param callback: Callback function to invoke with each received frame. The
         data is provided to the function as a bytearray. Optional. Can be
         omitted if the client has no interest in received frames (e.g. for
         a one-shot beaconing application).
     :type callback: function or None
+    :param int send_queue: Maximum number of frames to queue for sending, or
+        0 to write frames directly.
+    :param send_low_water: Number of queued frames below which the overflow
+        policy ceases to apply. Defaults to half of ``send_queue``.
+    :type send_low_water: int or None
+    :param Overflow send_overflow: Action to take when the send queue is full.
+    :param bool scheduled: Whether the send queue is scheduled, rather than
+        first in, first out. Requires ``send_queue``.
+    :param int encode_cache: Maximum total size, in bytes, of recently sent
+        data frames to keep encoded, so that sending the same data again on
+        the same port requires no encoding, or 0 for no cache. Only data
+        provided as bytes is cached.
+    :param int buffer_size: Maximum number of bytes to read from the TNC at
+        once. The receive buffer starts at twice this size, and grows as
+        necessary to hold longer frames.
+    :param bool frame_views: If True, frames are provided to the callback as
+        memoryview objects referencing the receive buffer, where possible,
+        instead of being copied. Such a view is valid only until the callback
+        returns, so the callback must copy any data it wishes to retain.
+    :param hub: Hub with which to receive frames, instead of using a thread
+        dedicated to this connection. If no callback is provided, frames are
+        passed to the hub's handler. Optional.
+    :type hub: Hub or None
+    :param executor: Where received frames are delivered. If None, the
+        callback is invoked on the thread receiving from the TNC. If an
+        executor (e.g. a thread pool, or a process pool for CPU-intensive
+        work), the callback is submitted to it, one frame at a time for each
+        KISS port, so that frames from the same port are processed in the
+        order received. If a queue, ``(port, data)`` tuples are put on it
+        instead of invoking the callback, and the callback may be None.
+    :type executor: concurrent.futures.Executor, queue.Queue or None
+    :param int max_pending: Maximum number of frames submitted to an executor
+        and not yet processed, or 0 for no limit. The limit for a queue is the
+        size of the queue itself.
+    :param Overflow dispatch_overflow: Action to take when the executor or
+        queue is full. Either BLOCK, which stops receiving from the TNC until
+        there is room, or DROP, which discards the frame.
+    :param stats: Statistics object in which to record activity on this
+        connection, or True to create a new one. If omitted, no statistics
+        are collected, and there is no overhead in collecting them.
+    :type stats: ~kiss.stats.Stats, bool or None
+    :param reconnect: Delays between attempts to reconnect after the
+        connection is lost, or True for the default delays. If omitted, the
+        connection is not re-established.
+    :type reconnect: Backoff, bool or None
+    :param int reconnect_queue: Maximum number of writes to hold while the
+        connection is down. A write may be a single frame, or several frames
+        sent together (e.g. by :meth:`send_many`).
+    :param on_disconnect: Function to invoke, with this connection, each time
+        the connection to the TNC is lost, but not when it is closed by
+        :meth:`disconnect_from_server`. It is invoked on whichever thread
+        noticed the loss. Optional.
+    :type on_disconnect: function or None
+    :param int ack_window: Maximum number of frames sent with ACKMODE and not
+        yet acknowledged, or 0 to disable ACKMODE.
+    :param float ack_timeout: Time, in seconds, to wait for each frame sent
+        with ACKMODE to be acknowledged.
     """
-    def __init__(self, callback):
-        self._sock = None
+    def __init__(self, callback, send_queue=0, send_low_water=None,
+                 send_overflow=Overflow.BLOCK, buffer_size=_BUF_LEN,
+                 frame_views=False, hub=None, executor=None, max_pending=0,
+                 dispatch_overflow=Overflow.BLOCK, stats=None,
+                 reconnect=None, reconnect_queue=100, on_disconnect=None,
+                 ack_window=0, ack_timeout=10.0, scheduled=False,
+                 encode_cache=0):
+        if buffer_size < 1:
+            raise ValueError("Illegal buffer_size value: out of range")
+        if send_queue < 0:
+            raise ValueError("Illegal send_queue value: out of range")
+        if send_low_water is None:
+            send_low_water = send_queue // 2
+        elif send_low_water < 0 or send_low_water > send_queue:
+            raise ValueError("Illegal send_low_water value: out of range")
+        if scheduled and not send_queue:
+            raise ValueError("Illegal scheduled value: requires send_queue")
+        if max_pending < 0:
+            raise ValueError("Illegal max_pending value: out of range")
+        if encode_cache < 0:
+            raise ValueError("Illegal encode_cache value: out of range")
+        if dispatch_overflow is Overflow.RAISE:
+            raise ValueError("Illegal dispatch_overflow value: must be BLOCK"
+                             " or DROP")
+        if reconnect_queue < 1:
+            raise ValueError("Illegal reconnect_queue value: out of range")
+        if ack_window < 0 or ack_window > _MAX_SEQ:
+            raise ValueError("Illegal ack_window value: out of range")
+        if ack_timeout <= 0:
+            raise ValueError("Illegal ack_timeout value: out of range")
+        if callback is None and hub is not None and hub.handler is not None:
+            callback = functools.partial(hub.handler, self)
+        if stats is True:
+            stats = Stats()
+        self._stats = stats or None
+        self._read_time = 0
+        self._transport = None
         self._receiver = None
-        self._client_callback = callback
+        self._hub = hub
+        self._executor = executor
+        self._max_pending = max_pending
+        self._dispatch_overflow = dispatch_overflow
+        if isinstance(executor, queue.Queue):
+            callback = executor
+        self._default_route = self._make_route(callback)
+        # Where to deliver frames, indexed by KISS port
+        self._routes = [self._default_route] * MAX_PORTS
+        # Handlers for frames other than data frames, indexed by command
+        self._handlers = [None] * 16
+        # Airtime limiters, indexed by KISS port
+        self._limiters = [None] * MAX_PORTS
+        if ack_window:
+            self._acks = _AckTracker(ack_window, ack_timeout, send_overflow)
+            self._handlers[Command.ACKMODE.value] = self._acks.acknowledged
+        else:
+            self._acks = None
+        if reconnect is True:
+            reconnect = Backoff()
+        self._backoff = reconnect or None
+        self._reconnect_queue = reconnect_queue
+        self._on_disconnect = on_disconnect
+        self._state = State.CLOSED
+        self._state_cond = threading.Condition()
+        self._closing = threading.Event()
+        self._online = False     # Whether the transport may be written to
+        self._lost = False       # Lost again while reconnecting
+        self._generation = 0     # Incremented each time receiving stops
+        self._reconnector = None
+        self._held = None        # Writes held while the connection is down
+        self._settings = {}      # Most recent value for each parameter
+        self._buffer_size = buffer_size
+        self._frame_views = frame_views
+        self._decoder = None
+        self._local = threading.local()  # Holds each thread's open batch
+        self._send_lock = threading.Lock()
+        self._send_queue_args = (send_queue, send_low_water, send_overflow)
+        self._scheduled = scheduled
+        self._frame_cache = _FrameCache(encode_cache) if encode_cache else None
+        self._send_queue = None
+        self._sender = None
 
     def connect_to_server(self, host=DEF_HOST, port=DEF_PORT):
         """
@@ -103,45 +417,396 @@ class Connection:
         :param str host: The host to which to connect.
         :param int port: The port on which to connect.
         """
-        if self._sock:
+        self.connect(TcpTransport(host, port))
+
+    def connect(self, transport):
+        """
+        Connect to the KISS TNC using the provided transport, such as a
+        :class:`~kiss.transport.SerialTransport` for a directly attached TNC.
+        In all other respects, this is the same as :meth:`connect_to_server`.
+
+        :param transport: The transport to open and use.
+        :type transport: ~kiss.transport.Transport
+        """
+        if self._transport:
             raise ValueError('Already connected')
-        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self._sock.connect((host, port))
-        if self._client_callback:
-            self._receiver = _ReceiveThread(self)
-            self._receiver.start()
+        self._set_state(State.CONNECTING)
+        try:
+            transport.open()
+        except Exception:
+            self._set_state(State.CLOSED)
+            raise
+        self._transport = transport
+        self._settings.clear()
+        self._closing.clear()
+        if self._acks is not None:
+            self._acks.open()
+        if self._backoff is not None:
+            self._held = _SendQueue(self._reconnect_queue,
+                                    self._reconnect_queue,
+                                    self._send_queue_args[2])
+        self._online = True
+        if self._scheduled:
+            self._send_queue = _Scheduler(*self._send_queue_args,
+                                          stats=self._stats)
+        elif self._send_queue_args[0]:
+            self._send_queue = _SendQueue(*self._send_queue_args)
+        if self._send_queue is not None:
+            self._sender = _SendThread(self)
+            self._sender.start()
+        # The connection may be lost as soon as receiving starts
+        self._set_state(State.CONNECTED)
+        self._start_receiving()
 
-    def disconnect_from_server(self):
+    def disconnect_from_server(self, drain_timeout=10.0):
         """
         Disconnect from the KISS TNC. Do not call other methods on this class
         after this call, except to (re)connect to a server. Calling this
         method when not connected is a no-op.
+
+        :param drain_timeout: When a send queue is used, the maximum time, in
+            seconds, to wait for queued frames to be sent, after which any
+            remaining are discarded. This prevents a TNC that has stopped
+            accepting data from preventing disconnection. None to wait
+            indefinitely.
+        :type drain_timeout: float or None
         """
-        if not self._sock:
+        if not self._transport:
             return
-        if self._receiver:
-            self._receiver.active = False
-        try:
-            self._sock.shutdown(socket.SHUT_RDWR)
-            self._sock.close()
-        except OSError:
-            pass
-        finally:
-            self._sock = None
-        if self._receiver:
-            self._receiver.join()
-            self._receiver = None
+        with self._state_cond:
+            self._closing.set()
+            if self._state is not State.CLOSED:
+                self._state = State.DRAINING
+            reconnector = self._reconnector
+            self._reconnector = None
+        if reconnector:
+            reconnector.join()
+        if self._held is not None:
+            # Anything held for a connection that was down is discarded
+            self._held.close()
+        if self._sender:
+            # Allow anything already queued to be sent first
+            self._send_queue.close()
+            self._sender.join(drain_timeout)
+            if self._sender.is_alive():
+                # Closing the transport wakes a writer that is blocked
+                self._send_queue.discard()
+                self._transport.close()
+                self._sender.join()
+            self._sender = None
+            self._send_queue = None
+        receiver = self._stop_receiving()
+        self._transport.close()
+        self._transport = None
+        self._online = False
+        self._held = None
+        if receiver and receiver is not threading.current_thread():
+            receiver.join()
+        if self._acks is not None:
+            self._acks.close()
+        self._set_state(State.CLOSED)
 
-    def send_data(self, data, port=0):
+    @property
+    def state(self):
+        """
+        The current stage in the lifecycle of this connection.
+
+        :type: State
+        """
+        return self._state
+
+    def wait_closed(self, timeout=None):
+        """
+        Wait until the state of this connection is CLOSED, either because
+        :meth:`disconnect_from_server` was called, or because the connection
+        was lost and is not resilient.
+
+        :param timeout: Maximum time to wait, in seconds, or None to wait
+            indefinitely.
+        :type timeout: float or None
+        :return: True if the connection is closed, or False if the timeout
+            expired first.
+        :rtype: bool
+        """
+        with self._state_cond:
+            return self._state_cond.wait_for(
+                lambda: self._state is State.CLOSED, timeout)
+
+    def send_data(self, data, port=0, ack=False,
+                  priority=Priority.INTERACTIVE, max_age=None):
         """
         Send the provided data in a data frame.
 
+        If acknowledgement is requested, the frame is sent using ACKMODE, and
+        a future is returned. Its result is set, to None, once the TNC reports
+        that the frame has been transmitted. If that does not happen within
+        the timeout, or the connection is closed first, its exception is set
+        instead, to a TimeoutError or :class:`KissException` respectively.
+
         :param data: Data to be sent.
         :type data: bytes or bytearray
         :param int port: KISS port number.
+        :param bool ack: Whether to send the frame using ACKMODE. The
+            connection must have been created with an ``ack_window``.
+        :param Priority priority: Priority of the frame in a scheduled send
+            queue.
+        :param max_age: Time, in seconds, after which the frame is discarded
+            if still waiting in a scheduled send queue, or None to wait
+            indefinitely.
+        :type max_age: float or None
+        :return: A future, if acknowledgement was requested and the frame was
+            sent, or None otherwise. The frame is not sent if the data is
+            empty, or if the acknowledgement window or send queue is full,
+            or an airtime limit is reached, and the overflow policy is DROP.
+        :rtype: concurrent.futures.Future or None
+        :raises queue.Full: If the acknowledgement window is full and the
+            overflow policy is RAISE.
         """
-        if data and len(data):
-            self._send_frame(port, Command.DATA_FRAME, data)
+        if not data or not len(data):
+            return None
+        deadline = time.monotonic() + max_age if max_age is not None else None
+        if not ack:
+            frame = None
+            if self._frame_cache is not None and type(data) is bytes:
+                frame = self._frame_cache.get(port, data)
+            self._send_frame(port, Command.DATA_FRAME, data, priority,
+                             deadline, frame)
+            return None
+        if self._acks is None:
+            raise ValueError('ACKMODE not enabled')
+        reserved = self._acks.reserve()
+        if reserved is None:
+            return None
+        (seq, future) = reserved
+        try:
+            sent = self._send_frame(port, Command.ACKMODE,
+                                    seq.to_bytes(2, 'big') + bytes(data),
+                                    priority, deadline)
+        except Exception:
+            self._acks.discard(seq)
+            raise
+        if not sent:
+            # No acknowledgement will come for a frame that was dropped
+            self._acks.discard(seq)
+            return None
+        return future
+
+    def prepare(self, data, port=0):
+        """
+        Encode the provided data as a data frame in advance, so that it can
+        be sent repeatedly, e.g. as a beacon, without being encoded each
+        time. The result may be sent on any connection.
+
+        :param data: Data to be sent.
+        :type data: bytes or bytearray
+        :param int port: KISS port number.
+        :return: The encoded frame.
+        :rtype: PreparedFrame
+        """
+        if not data or not len(data):
+            raise ValueError("Illegal data value: empty")
+        return PreparedFrame(port, data)
+
+    def send_prepared(self, prepared, priority=Priority.INTERACTIVE,
+                      max_age=None):
+        """
+        Send a data frame encoded in advance by :meth:`prepare`.
+
+        :param PreparedFrame prepared: The frame to be sent.
+        :param Priority priority: Priority of the frame in a scheduled send
+            queue.
+        :param max_age: Time, in seconds, after which the frame is discarded
+            if still waiting in a scheduled send queue, or None to wait
+            indefinitely.
+        :type max_age: float or None
+        """
+        deadline = time.monotonic() + max_age if max_age is not None else None
+        self._send_frame(prepared.port, Command.DATA_FRAME, prepared.data,
+                         priority, deadline, prepared.frame)
+
+    @property
+    def ack_depth(self):
+        """
+        The number of frames sent using ACKMODE and not yet acknowledged.
+        Always 0 when ACKMODE is not enabled.
+        """
+        return len(self._acks) if self._acks is not None else 0
+
+    def route(self, port, target):
+        """
+        Deliver frames received on the specified KISS port to their own
+        callback or queue, instead of as specified when this connection was
+        created. Routes may be changed at any time. However, if the connection
+        was created without a callback or queue, any routes must be added
+        before connecting, since otherwise frames are not received at all.
+
+        A callback is submitted to the executor, if one was specified, one
+        frame at a time; ``max_pending`` then applies to each route
+        separately.
+
+        :param int port: KISS port number, in the range 0 - 15.
+        :param target: Function to invoke with each frame received on the
+            port, a queue on which to put ``(port, data)`` tuples, or None to
+            restore the original destination.
+        :type target: function, queue.Queue or None
+        """
+        if port < 0 or port >= MAX_PORTS:
+            raise ValueError("Illegal port value: out of range")
+        if target is None:
+            self._routes[port] = self._default_route
+        else:
+            self._routes[port] = self._make_route(target)
+
+    def limit_airtime(self, port, bit_rate, burst=1.0,
+                      overflow=Overflow.BLOCK):
+        """
+        Limit the rate at which data frames are sent on the specified KISS
+        port to the rate at which the radio channel can transmit them.
+
+        The airtime of each frame is estimated from its encoded length and
+        the bit rate, plus the TX delay and TX tail most recently set for the
+        port on this connection. Until the TX delay is set, the default in
+        the spec, 500 ms, is assumed. Commands to the TNC are not limited.
+
+        When a frame would exceed the limit, the overflow policy applies.
+        With BLOCK, sending waits until the channel is expected to have room;
+        if a send queue is in use, it is the queue's writer thread that
+        waits, rather than the sender, which also delays frames queued for
+        other ports behind the waiting frame. With DROP, the frame is
+        discarded, and counted in :attr:`~kiss.stats.Stats.limited_frames`.
+        With RAISE, a queue.Full exception is raised.
+
+        :param int port: KISS port number, in the range 0 - 15.
+        :param bit_rate: Bit rate of the radio channel (e.g. 1200), or None
+            to remove the limit.
+        :type bit_rate: int or None
+        :param float burst: Airtime, in seconds, by which sending may get
+            ahead of the channel before the limit applies.
+        :param Overflow overflow: Action to take when a frame would exceed
+            the limit.
+        """
+        if port < 0 or port >= MAX_PORTS:
+            raise ValueError("Illegal port value: out of range")
+        if bit_rate is None:
+            self._limiters[port] = None
+            return
+        if bit_rate <= 0:
+            raise ValueError("Illegal bit_rate value: out of range")
+        if burst < 0:
+            raise ValueError("Illegal burst value: out of range")
+        self._limiters[port] = _AirtimeLimiter(bit_rate, burst, overflow)
+
+    def handle(self, command, handler):
+        """
+        Accept frames received with the specified command, such as replies
+        to :meth:`set_hardware` or frames from a vendor extension, passing
+        them to the handler. Frames other than data frames are otherwise
+        counted in :attr:`~kiss.stats.Stats.illegal_frames`, and dropped.
+
+        The handler is invoked on the thread receiving from the TNC, with the
+        KISS port, the command value (0 - 15), and the decoded data, which
+        may be empty.
+
+        :param command: The command, or its value, in the range 1 - 15.
+        :type command: Command or int
+        :param handler: Function to invoke with each such frame, or None to
+            drop them once more.
+        :type handler: function or None
+        """
+        if isinstance(command, Command):
+            command = command.value
+        if command < 1 or command > 15:
+            raise ValueError("Illegal command value: not received in frames")
+        self._handlers[command] = handler
+
+    @property
+    def stats(self):
+        """
+        Statistics for this connection, or None if they are not being
+        collected.
+
+        :type: ~kiss.stats.Stats or None
+        """
+        return self._stats
+
+    @property
+    def send_queue_depth(self):
+        """
+        The number of frames waiting in the send queue. Always 0 when no send
+        queue is in use.
+        """
+        return len(self._send_queue) if self._send_queue is not None else 0
+
+    def send_many(self, frames, port=0, priority=Priority.INTERACTIVE,
+                  max_age=None):
+        """
+        Send each of the provided data items in its own data frame. All of
+        the frames are written to the TNC at once.
+
+        :param frames: Data items to be sent.
+        :type frames: iterable of bytes or bytearray
+        :param int port: KISS port number.
+        :param Priority priority: Priority of the frames in a scheduled send
+            queue.
+        :param max_age: Time, in seconds, after which the frames are
+            discarded if still waiting in a scheduled send queue, or None to
+            wait indefinitely.
+        :type max_age: float or None
+        """
+        stats = self._stats
+        buffer = bytearray()
+        sizes = []
+        for data in frames:
+            if data and len(data):
+                start = len(buffer)
+                _build_frame(port, Command.DATA_FRAME, data, buffer)
+                sizes.append((len(data), len(buffer) - start))
+        if not buffer:
+            return
+        if not self._pace_frames(port, Command.DATA_FRAME, len(sizes),
+                                 len(buffer)):
+            return
+        if stats is not None:
+            for (data_size, size) in sizes:
+                stats._frame_sent(port, data_size, size)
+        batch = getattr(self._local, 'batch', None)
+        if batch is not None:
+            batch.extend(buffer)
+        else:
+            self._output(buffer, port, priority,
+                         time.monotonic() + max_age if max_age is not None
+                         else None)
+
+    @contextlib.contextmanager
+    def batch(self):
+        """
+        Collect all frames sent within a ``with`` block, and write them to the
+        TNC at once at the end of the block. This applies to all methods that
+        send frames. Nested batches are merged into the outermost one.
+
+        .. code-block:: python
+
+           with connection.batch():
+               connection.set_tx_delay(30)
+               for beacon in beacons:
+                   connection.send_data(beacon)
+
+        A batch applies only to the thread that opened it. Frames sent from
+        other threads meanwhile are written as usual, without waiting for the
+        batch to end.
+        """
+        local = self._local
+        if getattr(local, 'batch', None) is not None:
+            yield
+            return
+        local.batch = bytearray()
+        try:
+            yield
+        finally:
+            buffer = local.batch
+            local.batch = None
+            if buffer:
+                self._output(buffer)
 
     def set_tx_delay(self, tx_delay, port=0):
         """
@@ -150,9 +815,8 @@ class Connection:
         :param int tx_delay: Transmitter keyup delay.
         :param int port: KISS port number.
         """
-        if tx_delay < 0 or tx_delay > 255:
-            raise ValueError("Illegal tx_delay value: out of range")
-        self._send_frame(port, Command.TX_DELAY, bytes([tx_delay]))
+        self._set_parameter(port, Command.TX_DELAY,
+                            _byte_value('tx_delay', tx_delay))
 
     def set_persistence(self, persistence, port=0):
         """
@@ -161,9 +825,8 @@ class Connection:
         :param int persistence: The 'p' value, in the range 0 - 255.
         :param int port: KISS port number.
         """
-        if persistence < 0 or persistence > 255:
-            raise ValueError("Illegal persistence value: out of range")
-        self._send_frame(port, Command.PERSISTENCE, bytes([persistence]))
+        self._set_parameter(port, Command.PERSISTENCE,
+                            _byte_value('persistence', persistence))
 
     def set_slot_time(self, slot_time, port=0):
         """
@@ -172,9 +835,8 @@ class Connection:
         :param int slot_time: Slot interval.
         :param int port: KISS port number.
         """
-        if slot_time < 0 or slot_time > 255:
-            raise ValueError("Illegal slot_time value: out of range")
-        self._send_frame(port, Command.SLOT_TIME, bytes([slot_time]))
+        self._set_parameter(port, Command.SLOT_TIME,
+                            _byte_value('slot_time', slot_time))
 
     def set_tx_tail(self, tx_tail, port=0):
         """
@@ -183,9 +845,8 @@ class Connection:
         :param int tx_tail: Transmit hold up time.
         :param int port: KISS port number.
         """
-        if tx_tail < 0 or tx_tail > 255:
-            raise ValueError("Illegal tx_tail value: out of range")
-        self._send_frame(port, Command.TX_TAIL, bytes([tx_tail]))
+        self._set_parameter(port, Command.TX_TAIL,
+                            _byte_value('tx_tail', tx_tail))
 
     def set_full_duplex(self, full_duplex, port=0):
         """
@@ -194,10 +855,8 @@ class Connection:
         :param bool full_duplex: True for full duplex; False for half duplex.
         :param int port: KISS port number.
         """
-        if not isinstance(full_duplex, bool):
-            raise ValueError("Illegal full_duplex value: must be bool")
-        self._send_frame(port, Command.FULL_DUPLEX,
-                         bytes([1 if full_duplex else 0]))
+        self._set_parameter(port, Command.FULL_DUPLEX,
+                            _bool_value('full_duplex', full_duplex))
 
     def set_hardware(self, hardware, port=0):
         """
@@ -215,76 +874,1407 @@ class Connection:
         """
         self._send_frame(0, Command.RETURN, None)
 
-    def _send_frame(self, port, command, data):
-        frame = bytearray()
-        frame.extend(FEND)
-        frame.append(command.value | port << 4)
-        if data:
-            frame.extend(_encode_special(data))
-        frame.extend(FEND)
-        self._sock.send(frame)
-
-    def _frame_received(self, data):
-        first_byte = data[0]
-        port = first_byte & 0xF0 >> 4
-        command = first_byte & 0x0F
-        if command != 0:
-            raise KissException("Illegal frame type received")
-        self._client_callback(port, _decode_special(data[1:]))
-
-    def _receive_data(self):
-        buffer = bytearray()
+    def _set_parameter(self, port, command, value):
+        # Remember the value, to be restored after reconnecting
+        self._settings[(port, command)] = value
+        self._send_frame(port, command, value)
 
-        while True:
+    def _send_frame(self, port, command, data, priority=Priority.CONTROL,
+                    deadline=None, frame=None):
+        # The frame may be provided already encoded. Returns False if it was
+        # dropped rather than sent.
+        batch = getattr(self._local, 'batch', None)
+        if batch is not None:
+            start = len(batch)
+            if frame is None:
+                _build_frame(port, command, data, batch)
+            else:
+                batch.extend(frame)
+            size = len(batch) - start
+            paced = False
             try:
-                data = self._sock.recv(_BUF_LEN)
-            except OSError as e:
-                if e.errno in (errno.EBADF, WSAENOTSOCK):
-                    # Socket closed
+                paced = self._pace_frames(port, command, 1, size)
+            finally:
+                if not paced:
+                    # Dropped, or refused with an exception
+                    del batch[start:]
+            if not paced:
+                return False
+        else:
+            if frame is None:
+                frame = _build_frame(port, command, data)
+            size = len(frame)
+            if not self._pace_frames(port, command, 1, size):
+                return False
+            if not self._output(frame, port, priority, deadline):
+                return False
+        if self._stats is not None:
+            self._stats._frame_sent(port, len(data) if data else 0, size)
+        return True
+
+    def _pace_frames(self, port, command, frames, size):
+        # Applies any airtime limit for the port to frames about to be sent,
+        # unless it is left to the writer thread, and returns False if they
+        # are to be dropped
+        limiter = self._limiters[port]
+        if limiter is None or command.value not in _LIMITED_COMMANDS:
+            return True
+        if (limiter.overflow is Overflow.BLOCK
+                and self._send_queue is not None):
+            return True
+        delay = limiter.reserve(self._airtime(limiter, port, frames, size))
+        if delay is None:
+            if self._stats is not None:
+                self._stats.limited_frames += frames
+            return False
+        if delay:
+            self._closing.wait(delay)
+        return True
+
+    def _pace_queued(self, item):
+        # Waits, on the writer thread, for an airtime limit to allow queued
+        # frames to be written; all frames are assumed to be for the port of
+        # the first
+        command_byte = item[1]
+        port = command_byte >> 4
+        limiter = self._limiters[port]
+        if (limiter is None or limiter.overflow is not Overflow.BLOCK
+                or command_byte & 0x0F not in _LIMITED_COMMANDS):
+            return
+        frames = item.count(FEND) // 2
+        delay = limiter.reserve(self._airtime(limiter, port, frames,
+                                              len(item)))
+        if delay:
+            # Stop pacing once disconnecting
+            self._closing.wait(delay)
+
+    def _airtime(self, limiter, port, frames, size):
+        # Estimates airtime from the total encoded size of the frames
+        tx_delay = self._settings.get((port, Command.TX_DELAY))
+        tx_tail = self._settings.get((port, Command.TX_TAIL))
+        keyup = ((tx_delay[0] if tx_delay else _DEF_TX_DELAY)
+                 + (tx_tail[0] if tx_tail else 0))
+        return limiter.airtime(frames, size - 3 * frames, keyup)
+
+    def _output(self, data, port=0, priority=Priority.INTERACTIVE,
+                deadline=None):
+        # Returns False if the send queue is full and the data was dropped
+        if self._send_queue is not None:
+            return self._send_queue.put(data, port, priority, deadline)
+        self._write(data)
+        return True
+
+    def _write(self, data):
+        # Prevent frames from different threads being interleaved when they
+        # take more than one system call to write
+        held = self._held
+        error = None
+        with self._send_lock:
+            generation = self._generation
+            if held is None or self._online:
+                try:
+                    self._transport.write(data)
                     return
-                raise
-            if not data:
+                except OSError as e:
+                    error = e
+        if error is not None:
+            self._connection_lost(generation)
+            if held is None:
+                # Not resilient, so the sender must know
+                raise error
+        self._hold(held, data)
+
+    def _hold(self, held, data):
+        # Keep data to be written once the connection is restored
+        try:
+            held.put(data)
+        except ValueError:
+            return  # Disconnected meanwhile
+        if self._online:
+            # Restored meanwhile, possibly before the data was added
+            self._flush_held(held)
+
+    def _flush_held(self, held):
+        with self._send_lock:
+            if not self._online:
                 return
-            buffer += data
-            blen = len(buffer)
+            generation = self._generation
+            items = held.take()
+            if not items:
+                return
+            try:
+                self._transport.write(b''.join(items))
+                return
+            except OSError:
+                held.restore(items)
+        self._connection_lost(generation)
 
-            while True:
-                fend = buffer.find(FEND)
-                if fend < 0:
+    def _make_route(self, target):
+        # Returns the function to which frames are passed, and whether that
+        # is the target itself, invoked on the receiving thread
+        if target is None:
+            return (_ignore_frame, False)
+        if isinstance(target, queue.Queue):
+            return (_QueueDispatcher(target, self._dispatch_overflow).dispatch,
+                    False)
+        if self._executor is not None and not isinstance(self._executor,
+                                                         queue.Queue):
+            return (_ExecutorDispatcher(
+                self._executor, target, self._max_pending,
+                self._dispatch_overflow, self._stats).dispatch, False)
+        return (target, True)
+
+    def _start_receiving(self):
+        # Receiving is needed to notice when the TNC disconnects, even when
+        # frames are to be ignored
+        default = self._default_route
+        if (self._backoff is None and default[0] is _ignore_frame
+                and all(route is default for route in self._routes)
+                and not any(self._handlers)):
+            return
+        self._decoder = Decoder(self._frame_views, 2 * self._buffer_size)
+        if self._hub:
+            self._hub._add(self)
+        else:
+            self._receiver = _ReceiveThread(self, self._generation)
+            self._receiver.start()
+
+    def _stop_receiving(self):
+        # Returns the receive thread, if any, to be joined if necessary
+        with self._state_cond:
+            self._generation += 1
+            self._lost = False
+            receiver = self._receiver
+            self._receiver = None
+        if self._hub:
+            self._hub._remove(self)
+        # A receive thread stops once the transport is closed
+        return receiver
+
+    def _set_state(self, state):
+        with self._state_cond:
+            self._state = state
+            self._state_cond.notify_all()
+
+    def _connection_lost(self, generation):
+        # Invoked by whichever of the receiver or a writer notices first
+        with self._state_cond:
+            if generation != self._generation or self._closing.is_set():
+                return
+            if not self._online:
+                # Lost again before reconnecting completed, so try again
+                self._lost = True
+                return
+            self._online = False
+            if self._backoff is None:
+                self._state = State.CLOSED
+            else:
+                self._state = State.CONNECTING
+                self._reconnector = threading.Thread(
+                    target=self._reconnect, daemon=True)
+                self._reconnector.start()
+            self._state_cond.notify_all()
+        if self._on_disconnect:
+            self._on_disconnect(self)
+
+    def _reconnect(self):
+        receiver = self._stop_receiving()
+        self._transport.close()
+        for delay in self._backoff.delays():
+            if not self._wait_stopped(receiver):
+                return
+            if self._closing.wait(delay):
+                return
+            try:
+                self._transport.open()
+            except OSError:
+                continue
+            self._start_receiving()
+            with self._state_cond:
+                if self._closing.is_set():
+                    return
+                if not self._lost and self._restore():
+                    self._online = True
+                    self._state = State.CONNECTED
+                    self._state_cond.notify_all()
+                    self._reconnector = None
+                    if self._stats is not None:
+                        self._stats.reconnects += 1
+                    return
+            receiver = self._stop_receiving()
+            self._transport.close()
+
+    def _wait_stopped(self, receiver):
+        # Wait for the previous receive thread to finish, so that it cannot
+        # read from the transport once reopened. It may be running a
+        # callback that disconnects, so give up if that happens, returning
+        # False.
+        while receiver and receiver.is_alive():
+            receiver.join(0.1)
+            if self._closing.is_set():
+                return False
+        return True
+
+    def _restore(self):
+        # Send the settings and held data to the TNC all at once, returning
+        # True if successful
+        buffer = bytearray()
+        for ((port, command), value) in list(self._settings.items()):
+            _build_frame(port, command, value, buffer)
+        with self._send_lock:
+            items = self._held.take()
+            buffer.extend(b''.join(items))
+            try:
+                if buffer:
+                    self._transport.write(buffer)
+            except OSError:
+                self._held.restore(items)
+                return False
+        return True
+
+    def _frame_received(self, port, command, payload):
+        if command:
+            self._command_received(port, command, payload)
+            return
+        stats = self._stats
+        if stats is None:
+            self._routes[port][0](port, payload)
+            return
+        size = len(payload)
+        if not size:
+            stats.empty_frames += 1
+        (dispatch, inline) = self._routes[port]
+        stats._frame_received(port, size + len(_find_special(payload)), size)
+        start = time.perf_counter()
+        stats.dispatch_latency.observe(start - self._read_time)
+        dispatch(port, payload)
+        if inline:
+            stats.callback_latency.observe(time.perf_counter() - start)
+
+    def _inject_frame(self, port, command, payload):
+        # Deliver a frame from elsewhere (e.g. a replay) as if received,
+        # copied as it would have been unless views are wanted
+        if not self._frame_views and type(payload) is memoryview:
+            payload = bytearray(payload)
+        self._read_time = time.perf_counter()
+        self._frame_received(port, command, payload)
+
+    def _command_received(self, port, command, payload):
+        handler = self._handlers[command]
+        if handler is None:
+            if self._stats is not None:
+                self._stats.illegal_frames += 1
+            return
+        handler(port, command, payload)
+
+    def _receive_data(self, generation):
+        # Returns when the connection is closed at either end, or when a
+        # callback took so long that the connection has since been restored
+        try:
+            while generation == self._generation and self._receive_once():
+                pass
+        except OSError:
+            pass
+        self._connection_lost(generation)
+
+    def _receive_once(self):
+        # Returns False if the connection has been closed
+        decoder = self._decoder
+        buffer_size = self._buffer_size
+        count = self._transport.read_into(
+            decoder.writable(buffer_size)[:buffer_size])
+        if not count:
+            return False
+        stats = self._stats
+        if stats is not None:
+            self._read_time = time.perf_counter()
+            stats.bytes_received += count
+            pending = decoder.pending + count
+            if pending > stats.buffer_high_water:
+                stats.buffer_high_water = pending
+        if self._hub is None:
+            for (port, command, payload) in decoder.commit(count):
+                self._frame_received(port, command, payload)
+            return True
+        # A hub serves other connections too, so an error in a callback must
+        # not stop it, nor lose the other frames received with it
+        for (port, command, payload) in decoder.commit(count):
+            try:
+                self._frame_received(port, command, payload)
+            except Exception:
+                traceback.print_exc()
+        return True
+
+
+class AsyncConnection:
+    """
+    An asyncio connection to a KISS TNC.
+
+    This provides the same capabilities as :class:`Connection`, for use from
+    asyncio code. No additional threads are used; instead, received frames
+    are retrieved by iterating over the connection, as follows.
+
+    .. code-block:: python
+
+       async for (port, data) in connection:
+           ...
+
+    Iteration ends when the connection is closed by the TNC. Each frame is
+    provided as a bytearray. Frames other than data frames are skipped.
+    """
+    def __init__(self):
+        self._reader = None
+        self._writer = None
+        self._decoder = None
+        self._frames = collections.deque()
+
+    async def connect_to_server(self, host=DEF_HOST, port=DEF_PORT):
+        """
+        Connect to the KISS TNC.
+
+        Call this before any other methods on this class. It is an error to
+        call this again once connected. However, an instance may be reused
+        by connecting again after disconnection.
+
+        :param str host: The host to which to connect.
+        :param int port: The port on which to connect.
+        """
+        if self._writer:
+            raise ValueError('Already connected')
+        (self._reader, self._writer) = await asyncio.open_connection(
+            host, port)
+        self._decoder = Decoder()
+        self._frames.clear()
+
+    async def disconnect_from_server(self):
+        """
+        Disconnect from the KISS TNC. Do not call other methods on this class
+        after this call, except to (re)connect to a server. Calling this
+        method when not connected is a no-op.
+        """
+        if not self._writer:
+            return
+        writer = self._writer
+        self._reader = None
+        self._writer = None
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
+
+    async def send_data(self, data, port=0):
+        """
+        Send the provided data in a data frame.
+
+        :param data: Data to be sent.
+        :type data: bytes or bytearray
+        :param int port: KISS port number.
+        """
+        if data and len(data):
+            await self._send_frame(port, Command.DATA_FRAME, data)
+
+    async def send_many(self, frames, port=0):
+        """
+        Send each of the provided data items in its own data frame. All of
+        the frames are written to the TNC at once.
+
+        :param frames: Data items to be sent.
+        :type frames: iterable of bytes or bytearray
+        :param int port: KISS port number.
+        """
+        buffer = bytearray()
+        for data in frames:
+            if data and len(data):
+                _build_frame(port, Command.DATA_FRAME, data, buffer)
+        if buffer:
+            self._writer.write(buffer)
+            await self._writer.drain()
+
+    async def set_tx_delay(self, tx_delay, port=0):
+        """
+        Set the transmitter keyup  delay, in 10 ms units.
+
+        :param int tx_delay: Transmitter keyup delay.
+        :param int port: KISS port number.
+        """
+        await self._send_frame(port, Command.TX_DELAY,
+                               _byte_value('tx_delay', tx_delay))
+
+    async def set_persistence(self, persistence, port=0):
+        """
+        Set the 'p' persistence value.
+
+        :param int persistence: The 'p' value, in the range 0 - 255.
+        :param int port: KISS port number.
+        """
+        await self._send_frame(port, Command.PERSISTENCE,
+                               _byte_value('persistence', persistence))
+
+    async def set_slot_time(self, slot_time, port=0):
+        """
+        Set the slot interval, in 10 ms units.
+
+        :param int slot_time: Slot interval.
+        :param int port: KISS port number.
+        """
+        await self._send_frame(port, Command.SLOT_TIME,
+                               _byte_value('slot_time', slot_time))
+
+    async def set_tx_tail(self, tx_tail, port=0):
+        """
+        Set the post-TX hold up time, in 10 ms units.
+
+        :param int tx_tail: Transmit hold up time.
+        :param int port: KISS port number.
+        """
+        await self._send_frame(port, Command.TX_TAIL,
+                               _byte_value('tx_tail', tx_tail))
+
+    async def set_full_duplex(self, full_duplex, port=0):
+        """
+        Set full duplex on or off.
+
+        :param bool full_duplex: True for full duplex; False for half duplex.
+        :param int port: KISS port number.
+        """
+        await self._send_frame(port, Command.FULL_DUPLEX,
+                               _bool_value('full_duplex', full_duplex))
+
+    async def set_hardware(self, hardware, port=0):
+        """
+        Set a TNC-specific hardware value.
+
+        :param hardware: TNC-specific data.
+        :type hardware: bytes or bytearray
+        :param int port: KISS port number.
+        """
+        await self._send_frame(port, Command.SET_HARDWARE, hardware)
+
+    async def send_return(self):
+        """
+        Send the special return command to exit KISS.
+        """
+        await self._send_frame(0, Command.RETURN, None)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while True:
+            while not self._frames:
+                if not self._reader:
+                    raise StopAsyncIteration
+                data = await self._reader.read(_BUF_LEN)
+                if not data:
+                    raise StopAsyncIteration
+                self._frames.extend(self._decoder.feed(data))
+            (port, command, payload) = self._frames.popleft()
+            # Frames other than data frames are not supported here
+            if not command:
+                return (port, payload)
+
+    async def _send_frame(self, port, command, data):
+        self._writer.write(_build_frame(port, command, data))
+        await self._writer.drain()
+
+
+class Hub:
+    """
+    A single thread that receives frames for any number of connections.
+
+    Rather than each :class:`Connection` using its own thread to receive
+    frames, connections created with a hub are all serviced by the hub's
+    thread, which waits on all of their sockets at once. Sending is not
+    affected, and works exactly as for any other connection.
+
+    Callbacks are invoked on the hub's thread, so a slow callback delays the
+    receipt of frames on all of the hub's connections.
+
+    .. code-block:: python
+
+       def handler(connection, port, data):
+           ...
+
+       hub = kiss.Hub(handler)
+       connections = []
+       for (host, port) in servers:
+           connection = kiss.Connection(None, hub=hub)
+           connection.connect_to_server(host, port)
+           connections.append(connection)
+
+    The hub's thread is started when the first connection is made, and
+    continues until the hub is closed.
+
+    :param handler: Function to invoke with each frame received on any
+        connection created without its own callback. The function is passed
+        the connection as well as the KISS port and data. Optional.
+    :type handler: function or None
+    """
+    def __init__(self, handler=None):
+        self._handler = handler
+        self._selector = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._requests = []
+        self._wakeup = None
+
+    @property
+    def handler(self):
+        """
+        The function invoked with frames for connections that do not have
+        their own callback.
+        """
+        return self._handler
+
+    def close(self):
+        """
+        Stop receiving on all connections, and stop the hub's thread. The
+        connections themselves remain connected, and may still be used for
+        sending.
+        """
+        with self._lock:
+            thread = self._thread
+        if not thread:
+            return
+        self._call(self._stop)
+        thread.join()
+        with self._lock:
+            self._thread = None
+
+    def _add(self, connection):
+        with self._lock:
+            if not self._thread:
+                self._start()
+        data = (connection, connection._generation)
+        self._call(lambda: self._selector.register(
+            connection._transport, selectors.EVENT_READ, data))
+
+    def _remove(self, connection):
+        with self._lock:
+            if not self._thread:
+                return
+
+        def unregister():
+            try:
+                self._selector.unregister(connection._transport)
+            except (KeyError, ValueError):
+                pass
+        self._call(unregister)
+
+    def _start(self):
+        self._selector = selectors.DefaultSelector()
+        self._wakeup = socket.socketpair()
+        self._selector.register(self._wakeup[0], selectors.EVENT_READ)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _stop(self):
+        for key in list(self._selector.get_map().values()):
+            self._selector.unregister(key.fileobj)
+        self._selector.close()
+        self._selector = None
+        for sock in self._wakeup:
+            sock.close()
+
+    def _call(self, func):
+        # Changes to the selector are made only on the hub's thread, so that
+        # a socket can never be closed while it is being waited upon
+        if threading.current_thread() is self._thread:
+            func()
+            return
+        done = threading.Event()
+        with self._lock:
+            self._requests.append((func, done))
+            self._wakeup[1].send(b'\0')
+        done.wait()
+
+    def _run(self):
+        while self._selector:
+            for (key, _) in self._selector.select():
+                if key.data is None:
+                    self._run_requests()
                     break
-                if fend > 0:
-                    self._frame_received(buffer[:fend])
-                buffer = buffer[fend + 1:]
-                blen -= (fend + 1)
+                (connection, generation) = key.data
+                if generation != connection._generation:
+                    # Disconnected by a callback since the sockets were
+                    # selected, so its transport may already be closed
+                    continue
+                # Errors in callbacks are reported by the connection, so
+                # only a transport error or EOF ends the connection
+                try:
+                    active = connection._receive_once()
+                except OSError:
+                    active = False
+                if not active:
+                    self._selector.unregister(key.fileobj)
+                    connection._connection_lost(generation)
+
+    def _run_requests(self):
+        with self._lock:
+            self._wakeup[0].recv(_BUF_LEN)
+            requests = self._requests
+            self._requests = []
+        for (func, done) in requests:
+            try:
+                func()
+            finally:
+                done.set()
+
+
+class Decoder:
+    """
+    A decoder for a KISS byte stream, independent of any means of receiving
+    it. Data may come from a socket, a file, an asyncio or trio stream, or a
+    test, in pieces of any size; frames are recognized as they are completed.
+    This is the decoder used by :class:`Connection`.
+
+    .. code-block:: python
+
+       decoder = kiss.Decoder()
+       while data := stream.read(65536):
+           for (port, command, payload) in decoder.feed(data):
+               ...
+
+    Each frame is provided as its KISS port, its command value (0 for a data
+    frame), and its decoded payload.
+
+    :param bool views: If True, payloads that contain no escape sequences are
+        provided as memoryview objects referencing the decoder's buffer,
+        instead of being copied. Such a view is valid only until more data is
+        added.
+    :param int size: Initial size of the buffer. It grows as necessary to
+        hold longer frames.
+    :param bool strict: Whether or not to reject invalid escape sequences,
+        as for :func:`kiss.codec.decode`.
+    """
+    def __init__(self, views=False, size=_BUF_LEN, strict=False):
+        # Frames are always taken as views of the buffer, so that only the
+        # payload is copied, and only once, when views are not wanted
+        self._deframer = _Deframer(size, True)
+        self._views = views
+        self._strict = strict
+
+    @property
+    def pending(self):
+        """
+        The number of bytes received but not yet part of a complete frame.
+        """
+        return self._deframer.pending
+
+    def feed(self, data):
+        """
+        Add received data, and return the frames that it completes. The data
+        is added immediately, whether or not the frames are retrieved.
+
+        :param data: Data received.
+        :type data: bytes, bytearray or memoryview
+        :return: ``(port, command, payload)`` for each frame. If ``views``
+            is True, this is an iterator, which must be consumed before more
+            data is added.
+        :rtype: list or iterator of tuple
+        :raises ValueError: If ``strict`` is True and a frame contains an
+            invalid escape sequence. If ``views`` is True, this is raised
+            during iteration.
+        """
+        return self._decode(self._deframer.feed(data))
+
+    def writable(self, count):
+        """
+        Return space at the end of the decoder's buffer into which data may
+        be read directly, e.g. using ``socket.recv_into``, avoiding a copy.
+        Call :meth:`commit` once data has been read into it.
+
+        :param int count: Minimum number of bytes required.
+        :return: Writable view of the free space.
+        :rtype: memoryview
+        """
+        return self._deframer.writable(count)
+
+    def commit(self, count):
+        """
+        Add data that has been read into the space returned by
+        :meth:`writable`, and return the frames that it completes.
+
+        :param int count: Number of bytes read.
+        :return: ``(port, command, payload)`` for each frame, as for
+            :meth:`feed`.
+        :rtype: list or iterator of tuple
+        """
+        return self._decode(self._deframer.commit(count))
+
+    def reset(self):
+        """
+        Discard any partial frame, e.g. after reconnecting.
+        """
+        self._deframer.reset()
+
+    def _decode(self, frames):
+        frames = _decode_frames(frames, self._strict, self._views)
+        if self._views:
+            return frames
+        # Copied now, since the frames refer to the buffer until then
+        return list(frames)
+
+
+class Encoder:
+    """
+    An encoder producing a KISS byte stream, independent of any means of
+    sending it. The result may be written to a socket, a file, an asyncio or
+    trio stream, or anywhere else.
+
+    .. code-block:: python
+
+       encoder = kiss.Encoder()
+       buffer = encoder.encode(bytes([30]), command=kiss.Command.TX_DELAY)
+       encoder.encode_many(packets, port=1, out=buffer)
+       stream.write(buffer)
+    """
+    def encode(self, data, port=0, command=Command.DATA_FRAME, out=None):
+        """
+        Encode a single frame.
+
+        :param data: Frame data, which may be empty for a command.
+        :type data: bytes, bytearray or None
+        :param int port: KISS port number.
+        :param Command command: The command.
+        :param out: Buffer to which the frame is appended. Optional.
+        :type out: bytearray or None
+        :return: The encoded frame, or ``out`` if provided.
+        :rtype: bytearray
+        """
+        return _build_frame(port, command, data, out)
+
+    def encode_many(self, frames, port=0, out=None):
+        """
+        Encode each of the provided data items as a data frame. Empty items
+        are skipped.
+
+        :param frames: Data items to be encoded.
+        :type frames: iterable of bytes or bytearray
+        :param int port: KISS port number.
+        :param out: Buffer to which the frames are appended. Optional.
+        :type out: bytearray or None
+        :return: The encoded frames, or ``out`` if provided.
+        :rtype: bytearray
+        """
+        if out is None:
+            out = bytearray()
+        for data in frames:
+            if data and len(data):
+                _build_frame(port, Command.DATA_FRAME, data, out)
+        return out
 
 
 class _ReceiveThread(threading.Thread):
-    def __init__(self, connection):
+    def __init__(self, connection, generation):
         self.connection = connection
-        self.active = True
+        self.generation = generation
         super().__init__()
 
     def run(self):
-        while self.active:
-            self.connection._receive_data()
+        self.connection._receive_data(self.generation)
+
+
+class _SendThread(threading.Thread):
+    def __init__(self, connection):
+        self.connection = connection
+        super().__init__(daemon=True)
+
+    def run(self):
+        connection = self.connection
+        send_queue = connection._send_queue
+        while True:
+            # When pacing, frames are taken and written one at a time, so
+            # that a scheduler can still reorder those not yet taken
+            items = send_queue.get(
+                1 if any(connection._limiters) else _MAX_WRITE)
+            if not items:
+                break
+            try:
+                if any(connection._limiters):
+                    for data in items:
+                        connection._pace_queued(data)
+                        connection._write(data)
+                else:
+                    connection._write(b''.join(items))
+            except queue.Full:
+                pass  # Connection down, and too much already held
+            except OSError:
+                send_queue.close()
+                break
+
+
+class _SendQueue:
+    """
+    Bounded queue of encoded frames waiting to be written, with hysteresis
+    between the high and low watermarks.
+    """
+    def __init__(self, high_water, low_water, overflow):
+        self._high_water = high_water
+        self._low_water = low_water
+        self._overflow = overflow
+        self._items = collections.deque()
+        self._cond = threading.Condition()
+        self._full = False
+        self._closed = False
+
+    def __len__(self):
+        return len(self._items)
+
+    def put(self, item, port=0, priority=None, deadline=None):
+        """
+        Add encoded frames to the queue. The port and deadline are used only
+        by a scheduled queue. Frames of CONTROL priority are always added,
+        so that commands to the TNC cannot be held up or lost behind data.
+        """
+        with self._cond:
+            if self._closed:
+                raise ValueError('Not connected')
+            if priority is not Priority.CONTROL and (
+                    self._full or len(self) >= self._high_water):
+                self._full = True
+                if self._overflow is Overflow.DROP:
+                    return False
+                if self._overflow is Overflow.RAISE:
+                    raise queue.Full
+                while self._full and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    raise ValueError('Not connected')
+            self._add(item, port, priority, deadline)
+            self._cond.notify_all()
+            return True
+
+    def get(self, limit=_MAX_WRITE):
+        """
+        Wait for frames to be available, and return as many as fit within
+        the limit, or an empty list once the queue is closed and empty.
+        """
+        with self._cond:
+            while True:
+                while not len(self) and not self._closed:
+                    self._cond.wait()
+                if not len(self):
+                    return []
+                items = self._remove(limit)
+                if self._full and len(self) <= self._low_water:
+                    self._full = False
+                    self._cond.notify_all()
+                # Nothing is returned if every frame removed had expired
+                if items:
+                    return items
+
+    def _add(self, item, port, priority, deadline):
+        self._items.append(item)
+
+    def _remove(self, limit):
+        items = []
+        size = 0
+        while self._items and size < limit:
+            item = self._items.popleft()
+            items.append(item)
+            size += len(item)
+        return items
+
+    def take(self):
+        """
+        Return all queued frames at once, without waiting.
+        """
+        with self._cond:
+            items = list(self._items)
+            self._items.clear()
+            if self._full:
+                self._full = False
+                self._cond.notify_all()
+            return items
+
+    def discard(self):
+        """
+        Remove all queued frames, without waiting.
+        """
+        with self._cond:
+            self._remove(float('inf'))
+            if self._full:
+                self._full = False
+                self._cond.notify_all()
+
+    def restore(self, items):
+        """
+        Return frames obtained from :meth:`take` to the front of the queue,
+        regardless of its size, when they could not be written.
+        """
+        with self._cond:
+            self._items.extendleft(reversed(items))
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class _Scheduler(_SendQueue):
+    """
+    Send queue from which frames are removed in order of priority and,
+    within each priority, taking one frame from each KISS port in turn.
+    Frames whose deadline has passed are discarded as they are removed.
+    """
+    def __init__(self, high_water, low_water, overflow, stats=None):
+        super().__init__(high_water, low_water, overflow)
+        self._stats = stats
+        self._count = 0
+        # Frames and deadlines for each port, and the ports with frames in
+        # the order in which they are to be served, for each priority
+        self._queues = [{} for _ in Priority]
+        self._ready = [collections.deque() for _ in Priority]
+
+    def __len__(self):
+        return self._count
+
+    def _add(self, item, port, priority, deadline):
+        index = priority.value
+        frames = self._queues[index].get(port)
+        if frames is None:
+            frames = self._queues[index][port] = collections.deque()
+        if not frames:
+            self._ready[index].append(port)
+        frames.append((item, deadline))
+        self._count += 1
+
+    def _remove(self, limit):
+        items = []
+        size = 0
+        now = time.monotonic()
+        for (queues, ready) in zip(self._queues, self._ready):
+            while ready and size < limit:
+                port = ready.popleft()
+                frames = queues[port]
+                (item, deadline) = frames.popleft()
+                if frames:
+                    ready.append(port)
+                self._count -= 1
+                if deadline is not None and deadline < now:
+                    if self._stats is not None:
+                        self._stats.expired_frames += 1
+                    continue
+                items.append(item)
+                size += len(item)
+        return items
+
+
+class _FrameCache:
+    """
+    Encoded data frames, by port and data, with the least recently used
+    discarded once their total size exceeds the limit.
+    """
+    def __init__(self, limit):
+        self._limit = limit
+        self._size = 0
+        self._frames = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, port, data):
+        """
+        Return the encoded frame for the data, encoding it if necessary.
+        """
+        key = (port, data)
+        with self._lock:
+            frame = self._frames.get(key)
+            if frame is not None:
+                self._frames.move_to_end(key)
+                return frame
+        frame = bytes(_build_frame(port, Command.DATA_FRAME, data))
+        if len(frame) > self._limit:
+            return frame
+        with self._lock:
+            if key not in self._frames:
+                self._frames[key] = frame
+                self._size += len(frame)
+                while self._size > self._limit:
+                    (_, old) = self._frames.popitem(last=False)
+                    self._size -= len(old)
+        return frame
+
+
+class _AirtimeLimiter:
+    """
+    Token bucket limiting the airtime of frames sent on one KISS port. It is
+    kept as the time at which the channel is expected to be free, once all
+    of the frames sent so far have been transmitted; a frame may be sent
+    when that time is no more than the burst allowance ahead of the present.
+    """
+    def __init__(self, bit_rate, burst, overflow):
+        self.bit_rate = bit_rate
+        self.burst = burst
+        self.overflow = overflow
+        self._lock = threading.Lock()
+        self._free_at = 0.0
+
+    def airtime(self, frames, size, keyup):
+        """
+        Estimate the airtime, in seconds, of the specified number of frames
+        of the specified total size, with keyup time in 10 ms units.
+        """
+        bits = (size + frames * _HDLC_OVERHEAD) * 8
+        return frames * keyup / 100 + bits / self.bit_rate
+
+    def reserve(self, airtime):
+        """
+        Account for a frame about to be sent, and return the time, in
+        seconds, to wait before sending it, or None if it is to be dropped.
+        """
+        with self._lock:
+            now = time.monotonic()
+            free_at = max(self._free_at, now)
+            delay = free_at - self.burst - now
+            if delay > 0:
+                if self.overflow is Overflow.DROP:
+                    return None
+                if self.overflow is Overflow.RAISE:
+                    raise queue.Full
+            else:
+                delay = 0
+            self._free_at = free_at + airtime
+            return delay
+
+
+class _AckTracker:
+    """
+    Frames sent using ACKMODE and awaiting acknowledgement, each identified
+    by a 16-bit sequence number that the TNC returns once the frame has been
+    transmitted. Frames are added in the order in which they time out, so a
+    single thread waits for the oldest to expire, and runs only while there
+    are frames outstanding.
+    """
+    def __init__(self, window, timeout, overflow):
+        self._window = window
+        self._timeout = timeout
+        self._overflow = overflow
+        self._cond = threading.Condition()
+        self._pending = {}  # Future and deadline, by sequence number
+        self._next_seq = 0
+        self._thread = None
+        self._closed = True
+
+    def __len__(self):
+        return len(self._pending)
+
+    def open(self):
+        with self._cond:
+            self._closed = False
 
+    def reserve(self):
+        """
+        Allocate a sequence number, waiting for room in the window if
+        necessary, and return it with a new future, or None if the frame is
+        to be dropped.
+        """
+        with self._cond:
+            if self._closed:
+                raise ValueError('Not connected')
+            if len(self._pending) >= self._window:
+                if self._overflow is Overflow.DROP:
+                    return None
+                if self._overflow is Overflow.RAISE:
+                    raise queue.Full
+                while len(self._pending) >= self._window and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    raise ValueError('Not connected')
+            seq = self._next_seq
+            while seq in self._pending:
+                seq = (seq + 1) & _MAX_SEQ
+            self._next_seq = (seq + 1) & _MAX_SEQ
+            future = concurrent.futures.Future()
+            # The frame cannot be recalled once sent
+            future.set_running_or_notify_cancel()
+            self._pending[seq] = (future, time.monotonic() + self._timeout)
+            if not self._thread:
+                self._thread = threading.Thread(target=self._expire,
+                                                daemon=True)
+                self._thread.start()
+            return (seq, future)
+
+    def discard(self, seq):
+        """
+        Release a sequence number whose frame could not be sent.
+        """
+        with self._cond:
+            self._pending.pop(seq, None)
+            self._cond.notify_all()
+
+    def acknowledged(self, port, command, data):
+        # Handler for ACKMODE frames returned by the TNC
+        if len(data) < 2:
+            return
+        seq = (data[0] << 8) | data[1]
+        with self._cond:
+            entry = self._pending.pop(seq, None)
+            self._cond.notify_all()
+        if entry:
+            entry[0].set_result(None)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            pending = self._pending
+            self._pending = {}
+            thread = self._thread
+            self._cond.notify_all()
+        if thread and thread is not threading.current_thread():
+            thread.join()
+        for (future, _) in pending.values():
+            future.set_exception(
+                KissException('Disconnected before acknowledgement'))
+
+    def _expire(self):
+        while True:
+            expired = []
+            with self._cond:
+                if not self._pending or self._closed:
+                    self._thread = None
+                    return
+                now = time.monotonic()
+                for (seq, (future, deadline)) in self._pending.items():
+                    if deadline > now:
+                        break
+                    expired.append(seq)
+                if not expired:
+                    self._cond.wait(deadline - now)
+                    continue
+                futures = [self._pending.pop(seq)[0] for seq in expired]
+                self._cond.notify_all()
+            for future in futures:
+                future.set_exception(TimeoutError('Frame not acknowledged'))
+
+
+class _QueueDispatcher:
+    def __init__(self, frame_queue, overflow):
+        self._queue = frame_queue
+        self._overflow = overflow
+
+    def dispatch(self, port, data):
+        if isinstance(data, memoryview):
+            data = bytearray(data)
+        if self._overflow is Overflow.DROP:
+            try:
+                self._queue.put_nowait((port, data))
+            except queue.Full:
+                pass
+        else:
+            self._queue.put((port, data))
+
+
+class _ExecutorDispatcher:
+    """
+    Submits frames to an executor, allowing only one frame for each KISS port
+    to be outstanding at a time so that each port's frames are processed in
+    order. Further frames for a port wait here until the previous one has
+    been processed.
+    """
+    def __init__(self, executor, callback, max_pending, overflow, stats):
+        self._executor = executor
+        self._callback = callback
+        self._stats = stats
+        self._max_pending = max_pending
+        self._overflow = overflow
+        self._cond = threading.Condition()
+        self._pending = 0
+        self._waiting = {}  # Frames waiting, for each port with one in flight
+
+    def dispatch(self, port, data):
+        if isinstance(data, memoryview):
+            data = bytearray(data)
+        with self._cond:
+            if self._max_pending:
+                if (self._pending >= self._max_pending
+                        and self._overflow is Overflow.DROP):
+                    return
+                while self._pending >= self._max_pending:
+                    self._cond.wait()
+            self._pending += 1
+            waiting = self._waiting.get(port)
+            if waiting is not None:
+                waiting.append(data)
+                return
+            self._waiting[port] = collections.deque()
+        self._submit(port, data)
+
+    def _submit(self, port, data):
+        submitted = time.perf_counter() if self._stats is not None else 0
+        future = self._executor.submit(self._callback, port, data)
+        future.add_done_callback(
+            functools.partial(self._done, port, submitted))
+
+    def _done(self, port, submitted, future):
+        if self._stats is not None:
+            self._stats.callback_latency.observe(
+                time.perf_counter() - submitted)
+        if not future.cancelled() and future.exception():
+            e = future.exception()
+            traceback.print_exception(type(e), e, e.__traceback__)
+        with self._cond:
+            self._pending -= 1
+            self._cond.notify_all()
+            waiting = self._waiting[port]
+            if not waiting:
+                del self._waiting[port]
+                return
+            data = waiting.popleft()
+        self._submit(port, data)
+
+
+class _Deframer:
+    """
+    Incremental splitter of a KISS byte stream into frames.
+
+    Received data is added to a preallocated buffer, either by copying it in
+    with :meth:`feed`, or by reading directly into the space returned by
+    :meth:`writable` and then calling :meth:`commit`. A read cursor marks
+    the start of the frame currently being assembled, and the search for the
+    next FEND resumes where the previous search stopped, so that each byte is
+    examined only once. Consumed data is discarded by compacting the buffer
+    only when there is no room left for new data at the end, at which point
+    just the partial frame, if any, is moved. The buffer grows when a partial
+    frame fills more than half of it, keeping the total cost linear in the
+    number of bytes received.
 
-_BUF_LEN = 4096  # Buffer length for socket i/o
+    :param int size: Initial size of the buffer.
+    :param bool views: If True, frames are returned as memoryview slices of
+        the internal buffer, which remain valid only until more data is
+        added. If False, each frame is returned as a new bytearray.
+    """
+    def __init__(self, size=_BUF_LEN, views=False):
+        self._buffer = bytearray(size)
+        self._view = memoryview(self._buffer)
+        self._views = views
+        self._start = 0  # Start of the frame being assembled
+        self._scan = 0   # Position at which to resume the FEND search
+        self._end = 0    # End of valid data
+
+    @property
+    def pending(self):
+        """
+        The number of bytes received but not yet returned in a frame.
+        """
+        return self._end - self._start
 
+    def feed(self, data):
+        """
+        Add received data, and return a list of the frames it completes.
+        Empty frames (i.e. consecutive FENDs) are skipped.
 
-def _encode_special(data):
-    # replace() always creates a new bytearray, so check first
-    if data.find(FESC) >= 0:
-        data = data.replace(FESC, ENC_FESC)
-    if data.find(FEND) >= 0:
-        data = data.replace(FEND, ENC_FEND)
-    return data
+        :param data: Data received from the TNC.
+        :type data: bytes, bytearray or memoryview
+        :return: Complete frames, without FENDs or decoding.
+        :rtype: list
+        """
+        count = len(data)
+        self.writable(count)[:count] = data
+        return self.commit(count)
 
+    def writable(self, count):
+        """
+        Return the free space at the end of the buffer, making sure that it
+        is at least the specified size.
+
+        :param int count: Minimum number of bytes required.
+        :return: Writable view of the free space.
+        :rtype: memoryview
+        """
+        if count > len(self._buffer) - self._end:
+            self._make_room(count)
+        return self._view[self._end:]
+
+    def commit(self, count):
+        """
+        Add data that has been written into the space returned by
+        :meth:`writable`, and return a list of the frames it completes.
+
+        :param int count: Number of bytes written.
+        :return: Complete frames, without FENDs or decoding.
+        :rtype: list
+        """
+        end = self._end + count
+        self._end = end
+        frames = []
+        find = self._buffer.find
+        start = self._start
+        scan = self._scan
+        while True:
+            fend = find(FEND, scan, end)
+            if fend < 0:
+                break
+            if fend > start:
+                if self._views:
+                    frames.append(self._view[start:fend])
+                else:
+                    frames.append(self._buffer[start:fend])
+            start = scan = fend + 1
+        if start == end:
+            # Everything consumed, so start again from the beginning
+            self._start = self._scan = self._end = 0
+        else:
+            self._start = start
+            self._scan = end
+        return frames
 
-def _decode_special(data):
-    # replace() always creates a new bytearray, so check first
-    if data.find(ENC_FEND) >= 0:
-        data = data.replace(ENC_FEND, FEND)
-    if data.find(ENC_FESC) >= 0:
-        data = data.replace(ENC_FESC, FESC)
-    return data
+    def reset(self):
+        """
+        Discard any partial frame.
+        """
+        self._start = self._scan = self._end = 0
+
+    def _make_room(self, count):
+        pending = self._end - self._start
+        size = len(self._buffer)
+        if pending + count > size or pending > size // 2:
+            size = max(size * 2, pending + count)
+            buffer = bytearray(size)
+            buffer[:pending] = self._view[self._start:self._end]
+            self._buffer = buffer
+            self._view = memoryview(buffer)
+        elif pending:
+            self._buffer[:pending] = self._view[self._start:self._end]
+        self._scan -= self._start
+        self._start = 0
+        self._end = pending
+
+
+def _decode_frames(frames, strict=False, views=True):
+    # Frames are without FENDs; yields (port, command, payload) for each. If
+    # views are not wanted, payloads without escapes, which are decoded as
+    # the frame itself, are copied.
+    for frame in frames:
+        first_byte = frame[0]
+        payload = codec.decode(frame[1:], strict)
+        if not views and type(payload) is memoryview:
+            payload = bytearray(payload)
+        yield (first_byte >> 4, first_byte & 0x0F, payload)
+
+
+def _ignore_frame(port, data):
+    pass
+
+
+def _byte_value(name, value):
+    if value < 0 or value > 255:
+        raise ValueError("Illegal {} value: out of range".format(name))
+    return bytes([value])
+
+
+def _bool_value(name, value):
+    if not isinstance(value, bool):
+        raise ValueError("Illegal {} value: must be bool".format(name))
+    return bytes([1 if value else 0])
+
+
+def _build_frame(port, command, data, frame=None):
+    if frame is None:
+        frame = bytearray()
+    frame.extend(FEND)
+    frame.append(command.value | port << 4)
+    if data:
+        codec.encode(data, frame)
+    frame.extend(FEND)
+    return frame
@@ -0,0 +1,215 @@
+# =============================================================================
+# Copyright (c) 2024 Martin F N Cooper
+#
+# Author: Martin F N Cooper
+# License: MIT License
+# =============================================================================
+
+"""
+KISS Bulk Decoding
+
+Decoding of a large buffer of KISS data, such as a capture file, in a single
+operation, for offline analysis of very many frames. The result is columnar:
+an array each of ports, commands, offsets and lengths, and a single buffer
+holding all of the decoded payloads one after another.
+
+If NumPy is installed, the work is done on whole arrays at a time, rather
+than frame by frame: FENDs and FESCs are located in a single pass each, and
+the payloads are then extracted, and any escape sequences decoded, without
+a Python loop. Otherwise, the same results are produced by pure Python code,
+more slowly. NumPy can be installed along with this package as follows.
+
+.. code-block:: console
+
+   $ pip install pyham_kiss[numpy]
+
+.. code-block:: python
+
+   with open('today.kiss', 'rb') as f:
+       frames = kiss.bulk.decode(f.read())
+   print(len(frames), 'frames,', len(frames.payloads), 'bytes')
+   for (port, command, data) in frames:
+       ...
+"""
+
+from array import array
+import re
+
+from . import codec
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+_FEND = codec.FEND[0]
+_FESC = codec.FESC[0]
+_TFEND = codec.TFEND[0]
+_TFESC = codec.TFESC[0]
+
+# Works with any bytes-like object, including memoryview and mmap
+_search_fend = re.compile(re.escape(codec.FEND)).search
+
+
+class Frames:
+    """
+    Frames decoded in bulk. The arrays are NumPy arrays if NumPy is
+    installed, and otherwise ``array.array`` objects; either way, the frame
+    at index ``i`` is made up of ``ports[i]``, ``commands[i]``, and the
+    ``lengths[i]`` bytes of ``payloads`` starting at ``offsets[i]``.
+
+    Frames may also be iterated over, or accessed by index, as tuples of
+    ``(port, command, data)``, as for :class:`~kiss.Decoder`, where ``data``
+    is a memoryview of the payload buffer.
+    """
+    def __init__(self, ports, commands, offsets, lengths, payloads,
+                 consumed):
+        self.ports = ports
+        """ KISS port of each frame. """
+        self.commands = commands
+        """ Command value of each frame, 0 for a data frame. """
+        self.offsets = offsets
+        """ Start of each frame's payload within :attr:`payloads`. """
+        self.lengths = lengths
+        """ Length of each frame's payload. """
+        self.payloads = payloads
+        """ Decoded payloads of all frames, one after another. """
+        self.consumed = consumed
+        """
+        Number of bytes of the input that were decoded. Any bytes following
+        these are part of a frame that was not complete.
+        """
+        self._view = memoryview(payloads)
+
+    def __len__(self):
+        return len(self.ports)
+
+    def __reduce__(self):
+        # The view cannot be pickled, and is recreated when unpickled
+        return (Frames, (self.ports, self.commands, self.offsets,
+                         self.lengths, self.payloads, self.consumed))
+
+    def __getitem__(self, index):
+        offset = int(self.offsets[index])
+        return (int(self.ports[index]), int(self.commands[index]),
+                self._view[offset:offset + int(self.lengths[index])])
+
+    def __iter__(self):
+        view = self._view
+        for (port, command, offset, length) in zip(
+                self.ports.tolist(), self.commands.tolist(),
+                self.offsets.tolist(), self.lengths.tolist()):
+            yield (port, command, view[offset:offset + length])
+
+
+def decode(data, strict=False):
+    """
+    Decode all of the complete frames in the provided data. As for
+    :class:`~kiss.Decoder`, empty frames are skipped, and any data before the
+    first FEND is taken to be a frame.
+
+    :param data: Data to be decoded.
+    :type data: bytes, bytearray, memoryview or mmap
+    :param bool strict: Whether or not to reject invalid escape sequences,
+        as for :func:`kiss.codec.decode`.
+    :return: The decoded frames.
+    :rtype: Frames
+    :raises ValueError: If ``strict`` is True and a frame contains an
+        invalid escape sequence.
+    """
+    if numpy is None:
+        return _decode_python(data, strict)
+    return _decode_numpy(data, strict)
+
+
+def _decode_python(data, strict):
+    view = memoryview(data)
+    ports = array('B')
+    commands = array('B')
+    offsets = array('q')
+    lengths = array('q')
+    payloads = bytearray()
+    start = 0
+    match = _search_fend(data)
+    while match:
+        fend = match.start()
+        if fend > start:
+            first_byte = view[start]
+            ports.append(first_byte >> 4)
+            commands.append(first_byte & 0x0F)
+            offset = len(payloads)
+            codec.decode(view[start + 1:fend], strict, payloads)
+            offsets.append(offset)
+            lengths.append(len(payloads) - offset)
+        start = fend + 1
+        match = _search_fend(data, start)
+    view.release()
+    return Frames(ports, commands, offsets, lengths, payloads, start)
+
+
+def _decode_numpy(data, strict):
+    buf = numpy.frombuffer(data, numpy.uint8)
+    fends = numpy.flatnonzero(buf == _FEND)
+    if not fends.size:
+        empty = numpy.zeros(0, numpy.intp)
+        return Frames(empty.astype(numpy.uint8), empty.astype(numpy.uint8),
+                      empty, empty, numpy.zeros(0, numpy.uint8), 0)
+    consumed = int(fends[-1]) + 1
+    buf = buf[:consumed]
+
+    # Each frame runs from just after one FEND (or the start) to the next
+    starts = numpy.empty_like(fends)
+    starts[0] = 0
+    starts[1:] = fends[:-1] + 1
+    nonempty = fends > starts
+    starts = starts[nonempty]
+    ends = fends[nonempty]
+    first_bytes = buf[starts]
+
+    # Every byte that is neither a FEND nor a command byte is payload
+    keep = buf != _FEND
+    keep[starts] = False
+
+    escapes = numpy.flatnonzero((buf == _FESC) & keep)
+    if escapes.size:
+        # Within a run of FESCs, only every other one starts a sequence
+        count = escapes.size
+        indices = numpy.arange(count)
+        run_start = numpy.empty(count, bool)
+        run_start[0] = True
+        run_start[1:] = numpy.diff(escapes) != 1
+        run_first = numpy.maximum.accumulate(
+            numpy.where(run_start, indices, 0))
+        escapes = escapes[(indices - run_first) % 2 == 0]
+
+        # An FESC at the end of a frame is followed by a FEND
+        follows = escapes + 1
+        in_frame = keep[follows]
+        follows = follows[in_frame]
+        codes = buf[follows]
+        if strict:
+            if not in_frame.all():
+                raise ValueError('Invalid escape sequence: FESC at end')
+            invalid = (codes != _TFEND) & (codes != _TFESC)
+            if invalid.any():
+                raise ValueError(
+                    'Invalid escape sequence: FESC followed by 0x{:02X}'
+                    .format(int(codes[invalid][0])))
+        keep[escapes] = False
+        payloads = buf[keep]
+        # Only the bytes following FESCs change, and their positions in the
+        # payloads are found from the few positions that were not kept
+        dropped = numpy.flatnonzero(~keep)
+        payloads[follows - numpy.searchsorted(dropped, follows)] = (
+            numpy.where(codes == _TFEND, _FEND,
+                        numpy.where(codes == _TFESC, _FESC, codes)))
+        removed = (numpy.searchsorted(escapes, ends)
+                   - numpy.searchsorted(escapes, starts))
+    else:
+        payloads = buf[keep]
+        removed = 0
+
+    lengths = ends - starts - 1 - removed
+    offsets = numpy.cumsum(lengths) - lengths
+    return Frames(first_bytes >> 4, first_bytes & 0x0F, offsets, lengths,
+                  payloads, consumed)
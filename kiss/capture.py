@@ -0,0 +1,398 @@
+# =============================================================================
+# Copyright (c) 2024 Martin F N Cooper
+#
+# Author: Martin F N Cooper
+# License: MIT License
+# =============================================================================
+
+"""
+KISS Capture Files
+
+Recording of KISS frames to files, and reading them back for replay or
+analysis. Two formats are supported:
+
+* A capture file, which records the time at which each frame was received,
+  along with the frame itself. Records are only ever appended, so a capture
+  may be continued, and a file cut short by a crash remains readable up to
+  its last complete record.
+* A raw KISS file, containing exactly the byte stream exchanged with a TNC,
+  as written by many other tools (e.g. ``socat`` or ``nc``).
+
+Files are read through a memory map, and frames are decoded by the same code
+as is used by :class:`~kiss.Connection`. Frames containing no escape
+sequences are provided as memoryview objects referencing the map, so that no
+data is copied.
+
+A writer's :meth:`~CaptureWriter.write` method has the same signature as a
+connection callback, so that received traffic can be recorded directly.
+
+.. code-block:: python
+
+   with kiss.capture.CaptureWriter('today.kcap') as writer:
+       connection = kiss.Connection(writer.write)
+       ...
+
+   with kiss.capture.CaptureReader('today.kcap') as reader:
+       for (timestamp, port, command, data) in reader.frames(
+               reader.find(start_time)):
+           ...
+
+Capture file format, with all values little-endian:
+
+* An 8-byte file header, ``KISSCAP`` followed by a version byte of 1.
+* For each frame, a 12-byte record header holding the time of receipt as a
+  double in seconds since the epoch, and the length of the frame as a 32-bit
+  unsigned integer. The frame follows, as it would appear on the wire but
+  without FENDs; that is, the command byte, including the port, and the
+  escaped data.
+"""
+
+from array import array
+import bisect
+import mmap
+import os
+import struct
+import time
+
+from . import Command, MAX_PORTS, codec, _decode_frames
+
+MAGIC = b'KISSCAP\x01'  # Capture file header
+
+_RECORD = struct.Struct('<dI')  # Timestamp and frame length
+_RECORD_SIZE = _RECORD.size
+_FEND = codec.FEND[0]
+
+
+class CaptureWriter:
+    """
+    A writer of capture files. If the file already exists, frames are
+    appended to it.
+
+    :param str path: Path of the file.
+    :raises ValueError: If the file exists but is not a capture file.
+    """
+    def __init__(self, path):
+        self._file = open(path, 'ab+')
+        try:
+            if self._file.tell():
+                self._file.seek(0)
+                magic = self._file.read(len(MAGIC))
+                self._file.seek(0, os.SEEK_END)
+                if magic != MAGIC:
+                    raise ValueError(
+                        "Illegal path value: not a capture file")
+            else:
+                self._file.write(MAGIC)
+        except Exception:
+            self._file.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def write(self, port, data, timestamp=None, command=Command.DATA_FRAME):
+        """
+        Record a frame.
+
+        :param int port: KISS port number.
+        :param data: Frame data, without encoding.
+        :type data: bytes, bytearray or memoryview
+        :param timestamp: Time at which the frame was received, in seconds
+            since the epoch, or None for the current time.
+        :type timestamp: float or None
+        :param Command command: The command.
+        """
+        if port < 0 or port >= MAX_PORTS:
+            raise ValueError("Illegal port value: out of range")
+        record = bytearray(_RECORD_SIZE)
+        record.append(command.value | port << 4)
+        codec.encode(data, record)
+        _RECORD.pack_into(
+            record, 0, time.time() if timestamp is None else timestamp,
+            len(record) - _RECORD_SIZE)
+        self._file.write(record)
+
+    def flush(self):
+        """
+        Write any buffered records to the file.
+        """
+        self._file.flush()
+
+    def close(self):
+        """
+        Close the file.
+        """
+        self._file.close()
+
+
+class RawWriter:
+    """
+    A writer of raw KISS files. If the file already exists, frames are
+    appended to it.
+
+    :param str path: Path of the file.
+    """
+    def __init__(self, path):
+        self._file = open(path, 'ab')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def write(self, port, data, timestamp=None, command=Command.DATA_FRAME):
+        """
+        Record a frame. The timestamp is accepted for compatibility with
+        :meth:`CaptureWriter.write`, but is not recorded.
+
+        :param int port: KISS port number.
+        :param data: Frame data, without encoding.
+        :type data: bytes, bytearray or memoryview
+        :param timestamp: Ignored.
+        :type timestamp: float or None
+        :param Command command: The command.
+        """
+        if port < 0 or port >= MAX_PORTS:
+            raise ValueError("Illegal port value: out of range")
+        frame = bytearray(codec.FEND)
+        frame.append(command.value | port << 4)
+        codec.encode(data, frame)
+        frame.append(_FEND)
+        self._file.write(frame)
+
+    def flush(self):
+        """
+        Write any buffered frames to the file.
+        """
+        self._file.flush()
+
+    def close(self):
+        """
+        Close the file.
+        """
+        self._file.close()
+
+
+class _Reader:
+    """
+    Base class for readers. The file is mapped when the reader is created;
+    frames added to the file after that are not seen. The index of frame
+    positions is built when first needed.
+    """
+    def __init__(self, path, strict=False):
+        self._strict = strict
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            # An empty file cannot be mapped
+            self._map = mmap.mmap(
+                f.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        self._view = memoryview(self._map if size else b'')
+        self._starts = None
+        self._ends = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        self._build_index()
+        return len(self._starts)
+
+    def __iter__(self):
+        return self.frames()
+
+    def __getitem__(self, index):
+        self._build_index()
+        return next(self._decode(
+            self._starts[index], self._ends[index], index))
+
+    def frames(self, start=0, stop=None):
+        """
+        Iterate over frames, from one frame number to another.
+
+        :param int start: Number of the first frame.
+        :param stop: Number of the frame at which to stop, or None to
+            continue to the end.
+        :type stop: int or None
+        :return: The frames.
+        :rtype: iterator of tuple
+        """
+        if not start and stop is None and self._starts is None:
+            # Reading straight through does not need the index
+            return self._scan(None, None)
+        self._build_index()
+        starts = self._starts
+        ends = self._ends
+        if stop is None or stop > len(starts):
+            stop = len(starts)
+        return self._decode_range(starts, ends, start, stop)
+
+    def close(self):
+        """
+        Unmap the file. If memoryview objects provided for frames are still
+        in use, the file remains mapped until they have been released.
+        """
+        self._view.release()
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                # Unmapped instead when the last view is freed
+                pass
+            self._map = None
+
+    def _build_index(self):
+        if self._starts is not None:
+            return
+        starts = array('Q')
+        ends = array('Q')
+        self._scan(starts, ends)
+        self._starts = starts
+        self._ends = ends
+
+    def _decode_range(self, starts, ends, start, stop):
+        for index in range(start, stop):
+            yield next(self._decode(starts[index], ends[index], index))
+
+    def _scan(self, starts, ends):
+        # Finds each frame, adding its position to the index if provided, or
+        # otherwise yielding it decoded
+        raise NotImplementedError
+
+    def _decode(self, start, end, index):
+        # Yields the decoded frame at the given position
+        raise NotImplementedError
+
+
+class CaptureReader(_Reader):
+    """
+    A reader of capture files, providing each frame as a tuple of
+    ``(timestamp, port, command, data)``. Frames may be iterated over, or
+    accessed by frame number.
+
+    :param str path: Path of the file.
+    :param bool strict: Whether or not to reject invalid escape sequences,
+        as for :func:`kiss.codec.decode`.
+    :raises ValueError: If the file is not a capture file.
+    """
+    def __init__(self, path, strict=False):
+        super().__init__(path, strict)
+        self._times = None
+        if self._view[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError("Illegal path value: not a capture file")
+
+    def find(self, timestamp):
+        """
+        Find the first frame received at or after the specified time, which
+        may then be passed to :meth:`frames`. Frames are assumed to have been
+        recorded in order of time.
+
+        :param float timestamp: Time, in seconds since the epoch.
+        :return: Frame number, or the number of frames if all of them were
+            received earlier.
+        :rtype: int
+        """
+        self._build_index()
+        return bisect.bisect_left(self._times, timestamp)
+
+    def _build_index(self):
+        if self._starts is not None:
+            return
+        self._times = array('d')
+        super()._build_index()
+
+    def _scan(self, starts, ends):
+        generator = self._scan_records(starts, ends)
+        if starts is None:
+            return generator
+        for _ in generator:
+            pass
+
+    def _scan_records(self, starts, ends):
+        view = self._view
+        unpack = _RECORD.unpack_from
+        size = len(view)
+        pos = len(MAGIC)
+        strict = self._strict
+        while pos + _RECORD_SIZE <= size:
+            (timestamp, length) = unpack(view, pos)
+            start = pos + _RECORD_SIZE
+            pos = start + length
+            if pos > size or not length:
+                # Incomplete record, from a writer that did not finish
+                break
+            if starts is None:
+                first_byte = view[start]
+                yield (timestamp, first_byte >> 4, first_byte & 0x0F,
+                       codec.decode(view[start + 1:pos], strict))
+            else:
+                starts.append(start)
+                ends.append(pos)
+                self._times.append(timestamp)
+
+    def _decode(self, start, end, index):
+        for (port, command, data) in _decode_frames(
+                (self._view[start:end],), self._strict):
+            yield (self._times[index], port, command, data)
+
+
+class RawReader(_Reader):
+    """
+    A reader of raw KISS files, providing each frame as a tuple of
+    ``(port, command, data)``, as for :class:`~kiss.Decoder`. Frames may be
+    iterated over, or accessed by frame number. Empty frames are skipped.
+
+    :param str path: Path of the file.
+    :param bool strict: Whether or not to reject invalid escape sequences,
+        as for :func:`kiss.codec.decode`.
+    """
+    def _scan(self, starts, ends):
+        generator = self._find_frames()
+        if starts is None:
+            return _decode_frames(
+                (self._view[start:end] for (start, end) in generator),
+                self._strict)
+        for (start, end) in generator:
+            starts.append(start)
+            ends.append(end)
+
+    def _find_frames(self):
+        # Data following the last FEND is an incomplete frame, and ignored
+        if self._map is None:
+            return
+        find = self._map.find
+        start = 0
+        while True:
+            fend = find(codec.FEND, start)
+            if fend < 0:
+                break
+            if fend > start:
+                yield (start, fend)
+            start = fend + 1
+
+    def _decode(self, start, end, index):
+        return _decode_frames((self._view[start:end],), self._strict)
+
+
+def open_reader(path, strict=False):
+    """
+    Open a file of either format for reading, according to its content.
+
+    :param str path: Path of the file.
+    :param bool strict: Whether or not to reject invalid escape sequences,
+        as for :func:`kiss.codec.decode`.
+    :return: The reader.
+    :rtype: CaptureReader or RawReader
+    """
+    with open(path, 'rb') as f:
+        magic = f.read(len(MAGIC))
+    if magic == MAGIC:
+        return CaptureReader(path, strict)
+    return RawReader(path, strict)
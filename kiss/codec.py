@@ -0,0 +1,127 @@
+# =============================================================================
+# Copyright (c) 2024 Martin F N Cooper
+#
+# Author: Martin F N Cooper
+# License: MIT License
+# =============================================================================
+
+"""
+KISS Special Character Codec
+
+Functions to escape and unescape the special characters that may not appear
+literally within the body of a KISS frame. They may be used on their own, for
+example when working with captured KISS data.
+
+Decoding works in a single left-to-right pass, so that escape sequences are
+never misinterpreted as a result of the order in which they are processed.
+Encoding is instead done with up to two ``bytes.replace()`` calls, escaping
+FESC before FEND, which is correct in that order and, being done entirely in
+C, faster than a single pass driven from Python.
+"""
+
+import re
+
+# Special characters
+FEND  = b'\xC0'
+FESC  = b'\xDB'
+TFEND = b'\xDC'
+TFESC = b'\xDD'
+
+# Encoded special characters
+ENC_FEND = b'\xDB\xDC'
+ENC_FESC = b'\xDB\xDD'
+
+# Value to which the byte following FESC is decoded
+_UNESCAPE = {
+    TFEND[0]: FEND[0],
+    TFESC[0]: FESC[0]
+}
+
+# Work with any bytes-like object, including memoryview
+_search_fesc = re.compile(re.escape(FESC)).search
+_search_special = re.compile(b'[' + re.escape(FEND + FESC) + b']').search
+
+
+def encode(data, out=None):
+    """
+    Escape any special characters in the provided data.
+
+    If the data contains no special characters and no output buffer is
+    provided, the data is returned as is, without copying.
+
+    :param data: Data to be encoded.
+    :type data: bytes, bytearray or memoryview
+    :param out: Buffer to which the encoded data is appended. Optional.
+    :type out: bytearray or None
+    :return: The encoded data, or ``out`` if provided.
+    :rtype: bytes or bytearray
+    """
+    if isinstance(data, memoryview):
+        if out is not None and _search_special(data) is None:
+            # Nothing to escape, so append the view without copying it first
+            out += data
+            return out
+        data = data.tobytes()
+    # FESC must be escaped first, since escaping FEND introduces FESC
+    if FESC in data:
+        data = data.replace(FESC, ENC_FESC)
+    if FEND in data:
+        data = data.replace(FEND, ENC_FEND)
+    if out is None:
+        return data
+    out += data
+    return out
+
+
+def decode(data, strict=False, out=None):
+    """
+    Restore any escaped special characters in the provided data.
+
+    The spec requires that an FESC be followed only by TFEND or TFESC. By
+    default, an FESC followed by any other byte is dropped, and the byte that
+    follows it is retained; an FESC at the end of the data is dropped. In
+    strict mode, either of these raises a ValueError.
+
+    If the data contains no escape sequences and no output buffer is provided,
+    the data is returned as is, without copying.
+
+    :param data: Data to be decoded, without FENDs.
+    :type data: bytes, bytearray or memoryview
+    :param bool strict: Whether or not to reject invalid escape sequences.
+    :param out: Buffer to which the decoded data is appended. Optional.
+    :type out: bytearray or None
+    :return: The decoded data, or ``out`` if provided.
+    :rtype: bytes, bytearray or memoryview
+    :raises ValueError: If ``strict`` is True and the data contains an
+        invalid escape sequence.
+    """
+    match = _search_fesc(data)
+    if match is None:
+        if out is None:
+            return data
+        out += data
+        return out
+    if out is None:
+        out = bytearray()
+    length = len(data)
+    pos = 0
+    while match:
+        esc = match.start()
+        out += data[pos:esc]
+        pos = esc + 2
+        if pos > length:
+            if strict:
+                raise ValueError('Invalid escape sequence: FESC at end')
+            return out
+        code = data[esc + 1]
+        value = _UNESCAPE.get(code)
+        if value is None:
+            if strict:
+                raise ValueError(
+                    'Invalid escape sequence: FESC followed by 0x{:02X}'
+                    .format(code))
+            value = code
+        out.append(value)
+        match = _search_fesc(data, pos)
+    out += data[pos:]
+    return out
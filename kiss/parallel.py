@@ -0,0 +1,119 @@
+# =============================================================================
+# Copyright (c) 2024 Martin F N Cooper
+#
+# Author: Martin F N Cooper
+# License: MIT License
+# =============================================================================
+
+"""
+KISS Parallel Decoding
+
+Decoding of a large raw KISS file (see :mod:`kiss.capture`) using several
+processes, so that the work is spread across all of the available cores.
+
+The file is divided into chunks, each ending just after a FEND, so that
+every frame falls entirely within one chunk. Each worker process maps the
+file into memory and decodes its chunks from there with
+:func:`kiss.bulk.decode`, so that the file's data is never sent to the
+workers; only the decoded results are returned. Results are provided in the
+order of the file, as soon as each is available, with only a few chunks
+being decoded ahead of the caller at any one time.
+
+.. code-block:: python
+
+   if __name__ == '__main__':
+       for frames in kiss.parallel.decode_file('month.kiss', workers=8):
+           for (port, command, data) in frames:
+               ...
+
+As with any use of multiple processes, the main module of the application
+must be importable without side effects, as shown above, on platforms where
+new processes are spawned rather than forked (e.g. Windows and macOS).
+"""
+
+import collections
+import concurrent.futures
+import mmap
+import os
+
+from . import bulk, codec
+
+_CHUNK_SIZE = 16 * 1024 * 1024  # Default size of each chunk, in bytes
+
+
+def decode_file(path, workers=None, chunk_size=_CHUNK_SIZE, strict=False):
+    """
+    Decode all of the frames in a raw KISS file, in parallel.
+
+    :param str path: Path of the file.
+    :param workers: Number of worker processes, or None for the number of
+        CPUs. With 1, the file is decoded in the current process.
+    :type workers: int or None
+    :param int chunk_size: Approximate number of bytes in each chunk. Each
+        chunk is extended to the end of the frame in which it would
+        otherwise end.
+    :param bool strict: Whether or not to reject invalid escape sequences,
+        as for :func:`kiss.codec.decode`.
+    :return: Decoded frames for each chunk, in order.
+    :rtype: iterator of :class:`~kiss.bulk.Frames`
+    :raises ValueError: If ``strict`` is True and a frame contains an
+        invalid escape sequence. This is raised during iteration.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers < 1:
+        raise ValueError("Illegal workers value: out of range")
+    if chunk_size < 1:
+        raise ValueError("Illegal chunk_size value: out of range")
+    chunks = _split_file(path, chunk_size)
+    if workers == 1:
+        return (_decode_chunk(path, start, end, strict)
+                for (start, end) in chunks)
+    return _decode_parallel(path, chunks, workers, strict)
+
+
+def _decode_parallel(path, chunks, workers, strict):
+    # Keeping a few chunks in progress for each worker keeps them all busy,
+    # without holding many results that the caller has yet to consume
+    with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+        pending = collections.deque()
+        chunks = iter(chunks)
+        try:
+            for (start, end) in chunks:
+                pending.append(executor.submit(
+                    _decode_chunk, path, start, end, strict))
+                if len(pending) >= 2 * workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def _split_file(path, chunk_size):
+    # Returns (start, end) for each chunk
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if not size:
+            return []
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            chunks = []
+            start = 0
+            while start < size:
+                fend = data.find(codec.FEND, start + chunk_size - 1)
+                end = size if fend < 0 else fend + 1
+                chunks.append((start, end))
+                start = end
+    return chunks
+
+
+def _decode_chunk(path, start, end, strict):
+    # Runs in a worker process
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            view = memoryview(data)[start:end]
+            try:
+                return bulk.decode(view, strict)
+            finally:
+                view.release()
@@ -0,0 +1,312 @@
+# =============================================================================
+# Copyright (c) 2024 Martin F N Cooper
+#
+# Author: Martin F N Cooper
+# License: MIT License
+# =============================================================================
+
+"""
+KISS Traffic Replay
+
+Replay of captured frames (see :mod:`kiss.capture`) to any number of
+consumers, either with the timing with which they were captured, scaled to
+run faster or slower, or as fast as possible. This allows a busy period to be
+reproduced offline, or a downstream consumer to be tested against the shape
+of real traffic.
+
+A consumer may be any of the following:
+
+* A function, invoked as ``callback(port, data)`` for each data frame, just
+  as a connection callback would be.
+* A :class:`~kiss.Connection`, to which each frame is delivered as if it had
+  been received from a TNC, so that the connection's routes, handlers,
+  executor and statistics all apply. The connection need not be connected.
+* A :class:`ReplayServer`, which sends each frame to every client connected
+  to it, standing in for a TNC.
+
+.. code-block:: python
+
+   with kiss.capture.CaptureReader('today.kcap') as reader:
+       replay = kiss.replay.Replay(reader, speed=10)
+       replay.add(connection)
+       replay.add(archive_frame)
+       replay.run()
+
+Every consumer sees every frame, in order. Consumers are invoked one after
+another on the replay's thread, so a consumer that takes a long time delays
+the frames that follow, for all consumers; :attr:`Replay.max_lag` shows how
+far behind the replay fell.
+"""
+
+import selectors
+import socket
+import threading
+import time
+
+from . import Connection, DEF_HOST, codec
+
+_FEND = codec.FEND[0]
+
+
+class Replay:
+    """
+    A replay of frames to a set of consumers.
+
+    :param frames: Frames to be replayed, as provided by a capture reader,
+        i.e. tuples of ``(timestamp, port, command, data)``. Frames without
+        a timestamp, as provided by a raw KISS reader, are replayed as fast
+        as possible.
+    :type frames: iterable of tuple
+    :param float speed: Rate of replay relative to the original traffic,
+        e.g. 1 for the original timing, or 10 for ten times as fast, or 0 to
+        replay as fast as possible.
+    """
+    def __init__(self, frames, speed=1):
+        if speed < 0:
+            raise ValueError("Illegal speed value: out of range")
+        self._frames = frames
+        self._speed = speed
+        self._consumers = []
+        self._thread = None
+        self._stopping = threading.Event()
+        self.frames_replayed = 0
+        """ Frames delivered to consumers so far. """
+        self.max_lag = 0.0
+        """
+        Largest delay, in seconds, of a frame beyond the time at which it
+        should have been delivered.
+        """
+
+    def add(self, consumer):
+        """
+        Add a consumer, to which all frames are to be delivered. Consumers
+        must be added before the replay is started.
+
+        :param consumer: The consumer.
+        :type consumer: function, Connection or ReplayServer
+        """
+        if isinstance(consumer, Connection):
+            deliver = consumer._inject_frame
+        elif isinstance(consumer, ReplayServer):
+            deliver = consumer._send_frame
+        elif callable(consumer):
+            deliver = _data_only(consumer)
+        else:
+            raise ValueError("Illegal consumer value: not supported")
+        self._consumers.append(deliver)
+
+    def run(self):
+        """
+        Replay all frames, returning when all have been delivered or the
+        replay is stopped.
+        """
+        self._stopping.clear()
+        consumers = self._consumers
+        speed = self._speed
+        wait = self._stopping.wait
+        first = None
+        for frame in self._frames:
+            if self._stopping.is_set():
+                break
+            if len(frame) == 4:
+                (timestamp, port, command, data) = frame
+                if speed:
+                    now = time.monotonic()
+                    if first is None:
+                        (first, start) = (timestamp, now)
+                    due = start + (timestamp - first) / speed
+                    if due > now:
+                        if wait(due - now):
+                            break
+                    elif now - due > self.max_lag:
+                        self.max_lag = now - due
+            else:
+                (port, command, data) = frame
+            for deliver in consumers:
+                deliver(port, command, data)
+            self.frames_replayed += 1
+
+    def start(self):
+        """
+        Start replaying frames on a background thread.
+        """
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+
+    def wait(self, timeout=None):
+        """
+        Wait for a replay started with :meth:`start` to complete.
+
+        :param timeout: Maximum time to wait, in seconds, or None to wait
+            indefinitely.
+        :type timeout: float or None
+        :return: True if the replay has completed, or False if the timeout
+            expired.
+        :rtype: bool
+        """
+        self._thread.join(timeout)
+        return not self._thread.is_alive()
+
+    def stop(self):
+        """
+        Stop the replay, and wait for any frame currently being delivered to
+        be completed.
+        """
+        self._stopping.set()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join()
+
+
+class ReplayServer:
+    """
+    A KISS TCP server, which sends replayed frames to every client connected
+    to it. Anything sent by clients is discarded. Clients connecting part way
+    through a replay receive only the frames that follow.
+
+    .. code-block:: python
+
+       with kiss.replay.ReplayServer(port=8001) as server:
+           server.wait_for_clients(3)
+           replay.add(server)
+           replay.run()
+
+    :param str host: The host address on which to listen.
+    :param int port: The port on which to listen, or 0 to choose a free one.
+    """
+    def __init__(self, host=DEF_HOST, port=0):
+        self._bind_address = (host, port)
+        self._listener = None
+        self._selector = None
+        self._stop_pipe = None
+        self._thread = None
+        self._clients = []
+        self._lock = threading.Condition()
+
+    @property
+    def address(self):
+        """
+        The ``(host, port)`` on which the server is listening.
+        """
+        return self._listener.getsockname()[:2]
+
+    @property
+    def clients(self):
+        """
+        The number of clients currently connected.
+        """
+        return len(self._clients)
+
+    def start(self):
+        """
+        Start listening for clients.
+        """
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        listener.bind(self._bind_address)
+        listener.listen()
+        self._listener = listener
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(listener, selectors.EVENT_READ)
+        self._stop_pipe = socket.socketpair()
+        self._selector.register(self._stop_pipe[0], selectors.EVENT_READ)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop listening, and close all client connections.
+        """
+        if not self._listener:
+            return
+        self._stop_pipe[1].send(b'\0')
+        self._thread.join()
+        self._selector.close()
+        for sock in (self._listener,) + self._stop_pipe:
+            sock.close()
+        self._listener = None
+        with self._lock:
+            (clients, self._clients) = (self._clients, [])
+        for sock in clients:
+            sock.close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def wait_for_clients(self, count=1, timeout=None):
+        """
+        Wait until at least the specified number of clients are connected.
+
+        :param int count: Number of clients.
+        :param timeout: Maximum time to wait, in seconds, or None to wait
+            indefinitely.
+        :type timeout: float or None
+        :return: True if the clients are connected, or False if the timeout
+            expired.
+        :rtype: bool
+        """
+        with self._lock:
+            return self._lock.wait_for(
+                lambda: len(self._clients) >= count, timeout)
+
+    def _run(self):
+        selector = self._selector
+        while True:
+            for (key, _) in selector.select():
+                sock = key.fileobj
+                if sock is self._stop_pipe[0]:
+                    return
+                if sock is self._listener:
+                    self._accept()
+                    continue
+                try:
+                    data = sock.recv(65536)
+                except OSError:
+                    data = None
+                if not data:
+                    self._drop(sock)
+
+    def _accept(self):
+        try:
+            (sock, _) = self._listener.accept()
+        except OSError:
+            return
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._selector.register(sock, selectors.EVENT_READ)
+        with self._lock:
+            self._clients = self._clients + [sock]
+            self._lock.notify_all()
+
+    def _drop(self, sock):
+        with self._lock:
+            if sock not in self._clients:
+                return
+            self._clients = [s for s in self._clients if s is not sock]
+        try:
+            self._selector.unregister(sock)
+        except (KeyError, ValueError):
+            pass
+        sock.close()
+
+    def _send_frame(self, port, command, data):
+        frame = bytearray(codec.FEND)
+        frame.append(command | port << 4)
+        codec.encode(data, frame)
+        frame.append(_FEND)
+        # The list is replaced rather than modified, so needs no lock here
+        for sock in self._clients:
+            try:
+                sock.sendall(frame)
+            except OSError:
+                self._drop(sock)
+
+
+def _data_only(callback):
+    def deliver(port, command, data):
+        if not command:
+            callback(port, data)
+    return deliver
@@ -0,0 +1,218 @@
+# =============================================================================
+# Copyright (c) 2024 Martin F N Cooper
+#
+# Author: Martin F N Cooper
+# License: MIT License
+# =============================================================================
+
+"""
+KISS Connection Statistics
+
+Counters and latency histograms for a :class:`~kiss.Connection`, collected
+only when requested when the connection is created. Statistics may be read
+directly, or exported to a monitoring system such as Prometheus or StatsD,
+using either :meth:`Stats.snapshot` or :meth:`Stats.report`.
+
+Counters are updated without locking, so values may be slightly inexact when
+several threads are sending on the same connection at once.
+"""
+
+import bisect
+
+MAX_PORTS = 16  # Number of KISS ports
+
+# Default histogram bucket upper bounds, in seconds
+LATENCY_BOUNDS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0
+)
+
+
+class Histogram:
+    """
+    A histogram of observed values, with fixed buckets.
+
+    :param bounds: Upper bounds of the buckets, in increasing order. Values
+        greater than the last bound are counted in an additional bucket.
+    :type bounds: tuple of float
+    """
+    def __init__(self, bounds=LATENCY_BOUNDS):
+        self.bounds = tuple(bounds)
+        """ Upper bounds of the buckets. """
+        self.reset()
+
+    def reset(self):
+        """
+        Discard all observations.
+        """
+        self.counts = [0] * (len(self.bounds) + 1)
+        """ Number of values observed in each bucket. """
+        self.count = 0
+        """ Total number of values observed. """
+        self.sum = 0.0
+        """ Sum of all values observed. """
+
+    def observe(self, value):
+        """
+        Record an observed value.
+
+        :param float value: The value observed.
+        """
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """
+        Estimate a quantile of the observed values, as the upper bound of the
+        bucket in which it falls.
+
+        :param float q: The quantile, between 0 and 1 (e.g. 0.99).
+        :return: The estimated value, or None if there are no observations.
+            If the quantile falls in the last bucket, infinity is returned.
+        :rtype: float or None
+        """
+        if not self.count:
+            return None
+        target = q * self.count
+        total = 0
+        for (bound, count) in zip(self.bounds, self.counts):
+            total += count
+            if total >= target:
+                return bound
+        return float('inf')
+
+
+class Stats:
+    """
+    Statistics for one or more connections.
+
+    An instance may be shared between several connections, in which case it
+    accumulates totals for all of them. The per-port counters are lists,
+    indexed by KISS port number.
+    """
+    _COUNTERS = (
+        'bytes_received', 'frames_received', 'bytes_sent', 'frames_sent',
+        'escapes_received', 'escapes_sent', 'empty_frames', 'illegal_frames',
+        'reconnects', 'expired_frames', 'limited_frames'
+    )
+    _PORT_COUNTERS = (
+        'port_bytes_received', 'port_frames_received',
+        'port_bytes_sent', 'port_frames_sent'
+    )
+
+    def __init__(self):
+        self.callback_latency = Histogram()
+        """
+        Time taken to process each frame, in seconds. When an executor is
+        used, this includes any time spent waiting in the executor.
+        """
+        self.dispatch_latency = Histogram()
+        """
+        Time from receipt of the data completing a frame until the frame is
+        passed to the callback, executor or queue, in seconds.
+        """
+        self.reset()
+
+    def reset(self):
+        """
+        Reset all counters and histograms.
+        """
+        self.bytes_received = 0
+        """ Bytes received from the TNC, including framing. """
+        self.frames_received = 0
+        """ Non-empty frames received from the TNC. """
+        self.bytes_sent = 0
+        """ Bytes sent to the TNC, including framing. """
+        self.frames_sent = 0
+        """ Frames sent to the TNC. """
+        self.escapes_received = 0
+        """ Escape sequences decoded in received frames. """
+        self.escapes_sent = 0
+        """ Escape sequences encoded in sent frames. """
+        self.empty_frames = 0
+        """ Frames received with a command byte but no data. """
+        self.illegal_frames = 0
+        """
+        Received frames dropped because their command was other than a data
+        frame, and no handler was provided for it.
+        """
+        self.reconnects = 0
+        """ Times the connection was restored after being lost. """
+        self.expired_frames = 0
+        """ Queued frames discarded because they were not sent in time. """
+        self.limited_frames = 0
+        """ Frames discarded because they exceeded an airtime limit. """
+        self.buffer_high_water = 0
+        """ Largest amount of unprocessed data held in a receive buffer. """
+        self.port_bytes_received = [0] * MAX_PORTS
+        """ Payload bytes received on each KISS port. """
+        self.port_frames_received = [0] * MAX_PORTS
+        """ Frames received on each KISS port. """
+        self.port_bytes_sent = [0] * MAX_PORTS
+        """ Payload bytes sent on each KISS port. """
+        self.port_frames_sent = [0] * MAX_PORTS
+        """ Frames sent on each KISS port. """
+        self.callback_latency.reset()
+        self.dispatch_latency.reset()
+
+    def snapshot(self):
+        """
+        Return a copy of all of the statistics, for example for a Prometheus
+        collector.
+
+        :return: Counter values, per-port lists, and for each histogram, a
+            dict containing its ``bounds``, ``counts``, ``count`` and ``sum``.
+        :rtype: dict
+        """
+        result = {name: getattr(self, name) for name in self._COUNTERS}
+        result['buffer_high_water'] = self.buffer_high_water
+        for name in self._PORT_COUNTERS:
+            result[name] = list(getattr(self, name))
+        for name in ('callback_latency', 'dispatch_latency'):
+            histogram = getattr(self, name)
+            result[name] = {
+                'bounds': histogram.bounds,
+                'counts': list(histogram.counts),
+                'count': histogram.count,
+                'sum': histogram.sum
+            }
+        return result
+
+    def report(self, emit):
+        """
+        Pass each statistic to the provided function, for example to send it
+        to StatsD. Per-port counters are reported only for ports that have
+        been used, with a ``port`` label. For histograms, the count and sum
+        are reported, with ``_count`` and ``_sum`` appended to the name.
+
+        :param emit: Function to invoke as ``emit(name, value, labels)``,
+            where ``labels`` is a dict.
+        :type emit: function
+        """
+        for name in self._COUNTERS:
+            emit(name, getattr(self, name), {})
+        emit('buffer_high_water', self.buffer_high_water, {})
+        for name in self._PORT_COUNTERS:
+            for (port, value) in enumerate(getattr(self, name)):
+                if value:
+                    emit(name, value, {'port': port})
+        for name in ('callback_latency', 'dispatch_latency'):
+            histogram = getattr(self, name)
+            emit(name + '_count', histogram.count, {})
+            emit(name + '_sum', histogram.sum, {})
+
+    def _frame_sent(self, port, data_size, frame_size):
+        # Each frame has two FENDs and a command byte in addition to the data
+        self.frames_sent += 1
+        self.bytes_sent += frame_size
+        self.escapes_sent += frame_size - 3 - data_size
+        self.port_frames_sent[port] += 1
+        self.port_bytes_sent[port] += data_size
+
+    def _frame_received(self, port, size, data_size):
+        # Sizes are of the encoded data, and the decoded data
+        self.frames_received += 1
+        self.escapes_received += size - data_size
+        self.port_frames_received[port] += 1
+        self.port_bytes_received[port] += data_size
@@ -0,0 +1,356 @@
+# =============================================================================
+# Copyright (c) 2024 Martin F N Cooper
+#
+# Author: Martin F N Cooper
+# License: MIT License
+# =============================================================================
+
+"""
+Fake KISS TNC
+
+A KISS TCP server for testing and load generation, standing in for a real
+TNC such as Direwolf. It can echo frames back to the client, silently accept
+them, or generate frames of its own, at rates well beyond those of a real
+radio channel. Data can be written in fragments of random size, so that
+frame boundaries fall at varied positions within the client's reads, and
+latency and connection resets can be injected.
+
+All randomness comes from a seeded generator, so that a given configuration
+produces the same data every time. Note that TCP may still combine or split
+writes, so the exact sizes of the client's reads cannot be guaranteed.
+
+The server runs in background threads within the current process. It can
+also be run as a separate process, as follows.
+
+.. code-block:: console
+
+   $ python -m kiss.testing --mode generate --rate 500 --fragment 1 64
+"""
+
+import argparse
+from enum import Enum
+import random
+import socket
+import struct
+import threading
+import time
+
+from . import Command, DEF_HOST, _Deframer, _build_frame
+
+
+class Mode(Enum):
+    """
+    What the fake TNC does with each client connection.
+    """
+    ECHO     = 'echo'
+    """ Send each received frame back to the client """
+    SINK     = 'sink'
+    """ Accept and count received frames, and send nothing """
+    GENERATE = 'generate'
+    """ Send generated data frames, and count received frames """
+
+
+class FakeTnc:
+    """
+    A fake KISS TNC, serving any number of clients over TCP.
+
+    .. code-block:: python
+
+       with kiss.testing.FakeTnc(Mode.GENERATE, rate=1000, count=5000) as tnc:
+           connection.connect_to_server(*tnc.address)
+           ...
+
+    :param Mode mode: What to do with each client connection.
+    :param str host: The host address on which to listen.
+    :param int port: The port on which to listen, or 0 to choose a free one.
+    :param float rate: Generated frames per second, or 0 for as fast as
+        possible.
+    :param sizes: Minimum and maximum payload size of generated frames.
+    :type sizes: tuple of int
+    :param count: Number of frames to generate for each client, or None to
+        continue until the client disconnects.
+    :type count: int or None
+    :param ports: KISS ports on which to generate frames, chosen at random.
+    :type ports: tuple of int
+    :param fragment: Minimum and maximum size of each write, or None to write
+        each frame (or, when echoing, each read) whole.
+    :type fragment: tuple of int or None
+    :param float latency: Delay, in seconds, before each write.
+    :param reset_after: Number of frames to send or receive on a client
+        connection before resetting it, or None never to reset.
+    :type reset_after: int or None
+    :param int seed: Seed for generated data, fragment sizes and port
+        choices. Each client connection uses a different, but fixed, seed.
+    """
+    def __init__(self, mode=Mode.ECHO, host=DEF_HOST, port=0, rate=0,
+                 sizes=(16, 256), count=None, ports=(0,), fragment=None,
+                 latency=0, reset_after=None, seed=0):
+        self.mode = mode
+        self.rate = rate
+        self.sizes = sizes
+        self.count = count
+        self.ports = ports
+        self.fragment = fragment
+        self.latency = latency
+        self.reset_after = reset_after
+        self.seed = seed
+        self._bind_address = (host, port)
+        self._listener = None
+        self._thread = None
+        self._clients = []
+        self._lock = threading.Lock()
+        self.frames_received = 0
+        """ Frames received from all clients. """
+        self.bytes_received = 0
+        """ Bytes received from all clients. """
+        self.frames_sent = 0
+        """ Frames sent to all clients. """
+
+    @property
+    def address(self):
+        """
+        The ``(host, port)`` on which the server is listening.
+        """
+        return self._listener.getsockname()[:2]
+
+    def start(self):
+        """
+        Start listening for clients.
+        """
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        listener.bind(self._bind_address)
+        listener.listen()
+        self._listener = listener
+        self._thread = threading.Thread(target=self._accept, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop listening, and close all client connections.
+        """
+        listener = self._listener
+        if not listener:
+            return
+        self._listener = None
+        # Closing alone does not wake a thread blocked in accept()
+        try:
+            listener.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        listener.close()
+        self._thread.join()
+        with self._lock:
+            clients = self._clients
+            self._clients = []
+        for (sock, thread) in clients:
+            # As for the listener, closing alone does not wake recv()
+            _shutdown(sock)
+            _close(sock)
+            thread.join()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def _accept(self):
+        index = 0
+        while True:
+            try:
+                (sock, _) = self._listener.accept()
+            except (OSError, AttributeError):
+                break
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            client = _Client(self, sock, random.Random(self.seed + index))
+            thread = threading.Thread(target=client.run, daemon=True)
+            with self._lock:
+                self._clients.append((sock, thread))
+            thread.start()
+            index += 1
+
+    def _count(self, frames_received=0, bytes_received=0, frames_sent=0):
+        with self._lock:
+            self.frames_received += frames_received
+            self.bytes_received += bytes_received
+            self.frames_sent += frames_sent
+
+
+class _Client:
+    def __init__(self, server, sock, rng):
+        self._server = server
+        self._sock = sock
+        self._rng = rng
+        self._frames = 0  # Frames sent or received, for reset_after
+
+    def run(self):
+        if self._server.mode is Mode.GENERATE:
+            receiver = threading.Thread(
+                target=self._run_until_closed, args=(self._receive,),
+                daemon=True)
+            receiver.start()
+            self._run_until_closed(self._generate)
+            receiver.join()
+        else:
+            self._run_until_closed(self._receive)
+        _close(self._sock)
+
+    def _run_until_closed(self, func):
+        try:
+            func()
+        except _Reset:
+            _reset(self._sock)
+            _close(self._sock)
+        except OSError:
+            pass
+
+    def _receive(self):
+        server = self._server
+        deframer = _Deframer()
+        while True:
+            try:
+                data = self._sock.recv(65536)
+            except OSError:
+                return
+            if not data:
+                return
+            frames = deframer.feed(data)
+            server._count(frames_received=len(frames),
+                          bytes_received=len(data))
+            if server.mode is Mode.ECHO and frames:
+                buffer = bytearray()
+                for frame in frames:
+                    buffer.append(0xC0)
+                    buffer.extend(frame)
+                    buffer.append(0xC0)
+                self._send(buffer, len(frames))
+            elif self._count_frames(len(frames)):
+                raise _Reset
+
+    def _generate(self):
+        server = self._server
+        rng = self._rng
+        (min_size, max_size) = server.sizes
+        start = time.monotonic()
+        sent = 0
+        while server.count is None or sent < server.count:
+            if server.rate:
+                delay = start + sent / server.rate - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            size = rng.randint(min_size, max_size)
+            data = rng.getrandbits(8 * size).to_bytes(size, 'little')
+            port = rng.choice(server.ports)
+            self._send(_build_frame(port, Command.DATA_FRAME, data), 1)
+            sent += 1
+        self._sock.shutdown(socket.SHUT_WR)
+
+    def _send(self, data, frames):
+        server = self._server
+        if server.fragment:
+            (min_size, max_size) = server.fragment
+            view = memoryview(data)
+            while view:
+                size = self._rng.randint(min_size, max_size)
+                self._write(view[:size])
+                view = view[size:]
+        else:
+            self._write(data)
+        server._count(frames_sent=frames)
+        if self._count_frames(frames):
+            raise _Reset
+
+    def _write(self, data):
+        if self._server.latency:
+            time.sleep(self._server.latency)
+        self._sock.sendall(data)
+
+    def _count_frames(self, frames):
+        # Returns True if the connection should now be reset
+        self._frames += frames
+        reset_after = self._server.reset_after
+        return reset_after is not None and self._frames >= reset_after
+
+
+class _Reset(Exception):
+    pass
+
+
+def _reset(sock):
+    # A zero linger time causes close() to send RST instead of FIN
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER,
+                        struct.pack('ii', 1, 0))
+    except OSError:
+        pass
+
+
+def _shutdown(sock):
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+
+
+def _close(sock):
+    try:
+        sock.close()
+    except OSError:
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Run a fake KISS TNC.',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument(
+        '--mode', choices=[m.value for m in Mode], default=Mode.ECHO.value,
+        help='what to do with each client')
+    parser.add_argument(
+        '--host', default=DEF_HOST, help='host address on which to listen')
+    parser.add_argument(
+        '--port', type=int, default=0,
+        help='port on which to listen, or 0 for any')
+    parser.add_argument(
+        '--rate', type=float, default=0,
+        help='generated frames per second, or 0 for unlimited')
+    parser.add_argument(
+        '--sizes', type=int, nargs=2, default=(16, 256),
+        metavar=('MIN', 'MAX'), help='generated payload sizes')
+    parser.add_argument(
+        '--count', type=int, help='frames to generate for each client')
+    parser.add_argument(
+        '--ports', type=int, nargs='+', default=[0],
+        help='KISS ports on which to generate frames')
+    parser.add_argument(
+        '--fragment', type=int, nargs=2, metavar=('MIN', 'MAX'),
+        help='sizes of fragments in which to write data')
+    parser.add_argument(
+        '--latency', type=float, default=0,
+        help='delay before each write, in seconds')
+    parser.add_argument(
+        '--reset-after', type=int,
+        help='frames after which to reset each client connection')
+    parser.add_argument(
+        '--seed', type=int, default=0, help='seed for generated data')
+    args = parser.parse_args()
+
+    tnc = FakeTnc(
+        Mode(args.mode), args.host, args.port, args.rate, tuple(args.sizes),
+        args.count, tuple(args.ports),
+        tuple(args.fragment) if args.fragment else None, args.latency,
+        args.reset_after, args.seed)
+    tnc.start()
+    print('Listening on {}:{}'.format(*tnc.address), flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    tnc.stop()
+
+
+if __name__ == '__main__':
+    main()
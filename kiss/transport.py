@@ -0,0 +1,337 @@
+# =============================================================================
+# Copyright (c) 2024 Martin F N Cooper
+#
+# Author: Martin F N Cooper
+# License: MIT License
+# =============================================================================
+
+"""
+KISS Transports
+
+The means by which a :class:`~kiss.Connection` exchanges bytes with a TNC.
+Transports are provided for TCP/IP, Unix domain sockets, serial devices
+(e.g. a directly attached hardware TNC), and pseudo-terminals. All of them
+carry exactly the same KISS byte stream; framing and encoding are handled by
+the connection.
+
+Serial and pseudo-terminal transports are available only on POSIX systems.
+"""
+
+import errno
+import os
+import select
+import socket
+import threading
+
+try:
+    import termios
+    import tty
+except ImportError:
+    termios = None
+
+WSAENOTSOCK = 10038  # Windows error raised when socket is closed
+_WRITE_WAIT = 0.5    # Interval at which a blocked write checks for close
+
+
+class Transport:
+    """
+    Base class for transports.
+
+    A transport may be opened again after it has been closed.
+    """
+    def open(self):
+        """
+        Open the transport, making it ready for reading and writing.
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """
+        Close the transport. Any thread blocked in :meth:`read_into` returns
+        0. Closing a transport that is not open is a no-op.
+        """
+        raise NotImplementedError
+
+    def fileno(self):
+        """
+        Return the file descriptor that becomes readable when data arrives,
+        for use with selectors.
+
+        :return: File descriptor.
+        :rtype: int
+        """
+        raise NotImplementedError
+
+    def read_into(self, buffer):
+        """
+        Wait for data to arrive, and read as much as is available, up to the
+        size of the buffer.
+
+        :param buffer: Buffer into which to read.
+        :type buffer: memoryview or bytearray
+        :return: Number of bytes read, or 0 if the transport was closed at
+            either end.
+        :rtype: int
+        """
+        raise NotImplementedError
+
+    def write(self, data):
+        """
+        Write all of the provided data.
+
+        :param data: Data to be written.
+        :type data: bytes or bytearray
+        """
+        raise NotImplementedError
+
+
+class _SocketTransport(Transport):
+    def __init__(self):
+        self._sock = None
+
+    def open(self):
+        if self._sock:
+            raise ValueError('Already open')
+        self._sock = self._create_socket()
+
+    def close(self):
+        sock = self._sock
+        if not sock:
+            return
+        self._sock = None
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+            sock.close()
+        except OSError:
+            pass
+
+    def fileno(self):
+        return self._sock.fileno()
+
+    def read_into(self, buffer):
+        sock = self._sock
+        if not sock:
+            return 0
+        try:
+            return sock.recv_into(buffer)
+        except OSError as e:
+            if e.errno in (errno.EBADF, WSAENOTSOCK):
+                # Socket closed
+                return 0
+            raise
+
+    def write(self, data):
+        sock = self._sock
+        if not sock:
+            raise OSError(errno.EBADF, 'Transport closed')
+        sock.sendall(data)
+
+    def _create_socket(self):
+        raise NotImplementedError
+
+
+class TcpTransport(_SocketTransport):
+    """
+    A TCP/IP connection to a KISS server such as Direwolf.
+
+    :param str host: The host to which to connect.
+    :param int port: The port on which to connect.
+    """
+    def __init__(self, host, port):
+        super().__init__()
+        self._address = (host, port)
+
+    def _create_socket(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            sock.connect(self._address)
+        except OSError:
+            sock.close()
+            raise
+        # Frames are written whole, and batched when requested, so there is
+        # nothing to be gained by delaying them
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return sock
+
+
+class UnixTransport(_SocketTransport):
+    """
+    A Unix domain socket connection to a local KISS server.
+
+    :param str path: Path of the socket.
+    """
+    def __init__(self, path):
+        super().__init__()
+        self._path = path
+
+    def _create_socket(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self._path)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+
+class _FileTransport(Transport):
+    """
+    A transport over a terminal file descriptor, used in non-blocking mode.
+    A pipe is used to wake a reader when the transport is closed, since
+    closing a descriptor does not reliably wake a thread waiting on it. If a
+    read is in progress, the descriptors are closed when it completes, so
+    that they cannot be reused while still being waited upon.
+    """
+    def __init__(self):
+        if termios is None:
+            raise OSError(errno.ENOTSUP,
+                          'Serial transports require a POSIX system')
+        self._lock = threading.Lock()
+        self._fd = None
+        self._fds = ()  # All descriptors to be closed
+        self._reading = False
+
+    def open(self):
+        with self._lock:
+            if self._fd is not None or self._reading:
+                raise ValueError('Already open')
+            (fd, other_fds) = self._open_fds()
+            os.set_blocking(fd, False)
+            wakeup = os.pipe()
+            self._fd = fd
+            self._fds = (fd,) + wakeup + other_fds
+
+    def close(self):
+        with self._lock:
+            if self._fd is None:
+                return
+            self._fd = None
+            if self._reading:
+                os.write(self._fds[2], b'\0')
+                return
+        self._close_fds()
+
+    def fileno(self):
+        return self._fd
+
+    def read_into(self, buffer):
+        with self._lock:
+            if self._fd is None:
+                return 0
+            (fd, wakeup) = self._fds[:2]
+            self._reading = True
+        try:
+            while True:
+                try:
+                    return os.readv(fd, [buffer])
+                except BlockingIOError:
+                    pass
+                except OSError as e:
+                    # EIO means that the other side of a pty has been closed
+                    if e.errno == errno.EIO:
+                        return 0
+                    raise
+                (readable, _, _) = select.select([fd, wakeup], [], [])
+                if wakeup in readable:
+                    return 0
+        finally:
+            with self._lock:
+                self._reading = False
+                closed = self._fd is None
+            if closed:
+                self._close_fds()
+
+    def write(self, data):
+        view = memoryview(data)
+        while view:
+            # Checked each time, since a write may be waiting when closed
+            fd = self._fd
+            if fd is None:
+                raise OSError(errno.EBADF, 'Transport closed')
+            try:
+                count = os.write(fd, view)
+            except BlockingIOError:
+                select.select([], [fd], [], _WRITE_WAIT)
+                continue
+            view = view[count:]
+
+    def _open_fds(self):
+        # Returns the descriptor to use, and any others to be held open
+        raise NotImplementedError
+
+    def _close_fds(self):
+        (fds, self._fds) = (self._fds, ())
+        for fd in fds:
+            os.close(fd)
+
+
+class SerialTransport(_FileTransport):
+    """
+    A serial connection to a directly attached TNC, such as a TNC-Pi or a
+    Mobilinkd over Bluetooth serial, or to the pseudo-terminal provided by a
+    KISS server. The device is put into raw mode at the specified speed.
+
+    :param str device: Path of the serial device, e.g. ``/dev/ttyUSB0``.
+    :param baud_rate: Line speed, or None to leave the speed unchanged (e.g.
+        for a pseudo-terminal).
+    :type baud_rate: int or None
+    """
+    def __init__(self, device, baud_rate=9600):
+        super().__init__()
+        if baud_rate is not None:
+            speed = getattr(termios, 'B{}'.format(baud_rate), None)
+            if speed is None:
+                raise ValueError("Illegal baud_rate value: not supported")
+            baud_rate = speed
+        self._device = device
+        self._speed = baud_rate
+
+    def _open_fds(self):
+        fd = os.open(self._device, os.O_RDWR | os.O_NOCTTY)
+        try:
+            tty.setraw(fd)
+            attrs = termios.tcgetattr(fd)
+            attrs[2] |= termios.CLOCAL | termios.CREAD
+            if self._speed is not None:
+                attrs[4] = attrs[5] = self._speed
+            termios.tcsetattr(fd, termios.TCSANOW, attrs)
+        except (OSError, termios.error) as e:
+            os.close(fd)
+            raise _os_error(e)
+        return (fd, ())
+
+
+class PtyTransport(_FileTransport):
+    """
+    A new pseudo-terminal, for applications that expect to open a serial
+    device to talk to a KISS TNC. Once the transport is open, such an
+    application should be given the device named by :attr:`name`; data that
+    it writes there can then be read from this transport, and vice versa.
+
+    The other side of the pseudo-terminal is held open for as long as this
+    transport is open, so that applications may open and close it as they
+    wish.
+    """
+    def __init__(self):
+        super().__init__()
+        self.name = None
+        """ Device name of the other side of the pseudo-terminal. """
+
+    def _open_fds(self):
+        (fd, other_fd) = os.openpty()
+        try:
+            tty.setraw(other_fd)
+            self.name = os.ttyname(other_fd)
+        except (OSError, termios.error) as e:
+            os.close(fd)
+            os.close(other_fd)
+            raise _os_error(e)
+        return (fd, (other_fd,))
+
+
+def _os_error(e):
+    # Terminal functions raise termios.error, which is not an OSError, but
+    # callers expect only OSError when a transport cannot be opened
+    if isinstance(e, OSError):
+        return e
+    return OSError(*e.args)
@@ -0,0 +1,110 @@
+# =============================================================================
+# Copyright (c) 2024 Martin F N Cooper
+#
+# Author: Martin F N Cooper
+# License: MIT License
+# =============================================================================
+
+import queue
+import threading
+
+import pytest
+
+import kiss
+from kiss.testing import FakeTnc, Mode
+from kiss.transport import Transport
+
+
+class _StalledTransport(Transport):
+    # Never completes a write until closed, as for a TNC that stops reading
+    def __init__(self):
+        self.closed = threading.Event()
+        self.writing = threading.Event()
+
+    def open(self):
+        self.closed.clear()
+
+    def close(self):
+        self.closed.set()
+
+    def read_into(self, buffer):
+        self.closed.wait()
+        return 0
+
+    def write(self, data):
+        self.writing.set()
+        self.closed.wait()
+        raise OSError('Closed')
+
+
+def test_acknowledged_frames_resolved():
+    # Echoing ACKMODE frames back is just what a TNC does once they are sent
+    with FakeTnc(Mode.ECHO) as tnc:
+        connection = kiss.Connection(None, ack_window=4)
+        connection.connect_to_server(*tnc.address)
+        try:
+            futures = [connection.send_data(b'frame %d' % i, ack=True)
+                       for i in range(10)]
+            for future in futures:
+                assert future.result(5) is None
+            assert connection.ack_depth == 0
+        finally:
+            connection.disconnect_from_server()
+
+
+def test_unacknowledged_frame_times_out():
+    with FakeTnc(Mode.SINK) as tnc:
+        connection = kiss.Connection(None, ack_window=4, ack_timeout=0.1)
+        connection.connect_to_server(*tnc.address)
+        try:
+            future = connection.send_data(b'frame', ack=True)
+            assert isinstance(future.exception(5), TimeoutError)
+            assert connection.ack_depth == 0
+        finally:
+            connection.disconnect_from_server()
+
+
+def test_window_full():
+    with FakeTnc(Mode.SINK) as tnc:
+        connection = kiss.Connection(None, ack_window=2,
+                                     send_overflow=kiss.Overflow.DROP)
+        connection.connect_to_server(*tnc.address)
+        futures = [connection.send_data(b'frame', ack=True)
+                   for _ in range(3)]
+        assert futures[2] is None
+        assert connection.ack_depth == 2
+        connection.disconnect_from_server()
+    for future in futures[:2]:
+        assert isinstance(future.exception(0), kiss.KissException)
+
+
+def test_window_full_raises():
+    with FakeTnc(Mode.SINK) as tnc:
+        connection = kiss.Connection(None, ack_window=1,
+                                     send_overflow=kiss.Overflow.RAISE)
+        connection.connect_to_server(*tnc.address)
+        try:
+            connection.send_data(b'frame', ack=True)
+            with pytest.raises(queue.Full):
+                connection.send_data(b'frame', ack=True)
+        finally:
+            connection.disconnect_from_server()
+
+
+def test_frame_dropped_by_send_queue_releases_window():
+    connection = kiss.Connection(None, ack_window=8, send_queue=2,
+                                 send_overflow=kiss.Overflow.DROP)
+    transport = _StalledTransport()
+    connection.connect(transport)
+    try:
+        first = connection.send_data(b'first', ack=True)
+        assert transport.writing.wait(5)
+        # Two more frames are queued, and the rest dropped
+        futures = [connection.send_data(b'frame %d' % i, ack=True)
+                   for i in range(4)]
+        assert first is not None
+        assert [future is not None for future in futures] == [
+            True, True, False, False]
+        assert connection.ack_depth == 3
+    finally:
+        connection.disconnect_from_server(drain_timeout=0)
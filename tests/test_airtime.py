@@ -0,0 +1,91 @@
+# =============================================================================
+# Copyright (c) 2024 Martin F N Cooper
+#
+# Author: Martin F N Cooper
+# License: MIT License
+# =============================================================================
+
+import queue
+import threading
+import time
+
+import pytest
+
+import kiss
+from kiss.transport import Transport
+
+
+class _RecordingTransport(Transport):
+    def __init__(self):
+        self.data = bytearray()
+        self.closed = threading.Event()
+
+    def open(self):
+        self.closed.clear()
+
+    def close(self):
+        self.closed.set()
+
+    def read_into(self, buffer):
+        self.closed.wait()
+        return 0
+
+    def write(self, data):
+        self.data.extend(data)
+
+    def frames(self):
+        return [(port, command, bytes(payload)) for (port, command, payload)
+                in kiss.Decoder().feed(self.data)]
+
+
+def _connect(overflow, bit_rate=1200, **kwargs):
+    transport = _RecordingTransport()
+    connection = kiss.Connection(None, **kwargs)
+    connection.connect(transport)
+    connection.set_tx_delay(0)
+    connection.limit_airtime(0, bit_rate, burst=0, overflow=overflow)
+    return (connection, transport)
+
+
+def test_drop_when_limit_reached():
+    (connection, transport) = _connect(kiss.Overflow.DROP, stats=True)
+    for data in (b'one', b'two', b'three'):
+        connection.send_data(data)
+    connection.send_data(b'other port', port=1)
+    connection.set_tx_delay(30)
+    connection.disconnect_from_server()
+    assert transport.frames()[1:] == [
+        (0, 0, b'one'), (1, 0, b'other port'),
+        (0, kiss.Command.TX_DELAY.value, bytes([30]))]
+    assert connection.stats.limited_frames == 2
+
+
+def test_raise_when_limit_reached():
+    (connection, transport) = _connect(kiss.Overflow.RAISE)
+    connection.send_data(b'one')
+    with pytest.raises(queue.Full):
+        connection.send_data(b'two')
+    connection.disconnect_from_server()
+
+
+def test_block_until_channel_free():
+    # Each frame takes about 0.1 seconds to transmit at 9600 bps
+    (connection, transport) = _connect(kiss.Overflow.BLOCK, 9600)
+    start = time.monotonic()
+    for _ in range(3):
+        connection.send_data(bytes(100))
+    elapsed = time.monotonic() - start
+    connection.disconnect_from_server()
+    assert 0.15 < elapsed < 1
+    assert len(transport.frames()) == 4
+
+
+def test_dropped_ackmode_frame_releases_window():
+    (connection, transport) = _connect(kiss.Overflow.DROP, ack_window=5)
+    futures = [connection.send_data(data, ack=True)
+               for data in (b'one', b'two', b'three')]
+    assert futures[0] is not None
+    assert futures[1:] == [None, None]
+    assert connection.ack_depth == 1
+    connection.disconnect_from_server()
+    assert isinstance(futures[0].exception(), kiss.KissException)
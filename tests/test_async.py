@@ -0,0 +1,51 @@
+# =============================================================================
+# Copyright (c) 2024 Martin F N Cooper
+#
+# Author: Martin F N Cooper
+# License: MIT License
+# =============================================================================
+
+import asyncio
+
+import kiss
+from kiss.testing import FakeTnc, Mode
+
+
+def test_echo():
+    async def run(address):
+        connection = kiss.AsyncConnection()
+        await connection.connect_to_server(*address)
+        try:
+            await connection.set_tx_delay(30)
+            await connection.send_data(b'one\xC0', port=2)
+            await connection.send_many([b'two', b'three'])
+            frames = []
+            async for (port, data) in connection:
+                frames.append((port, data))
+                if len(frames) == 3:
+                    break
+            return frames
+        finally:
+            await connection.disconnect_from_server()
+
+    # Fragmented, so that frames are split across reads
+    with FakeTnc(Mode.ECHO, fragment=(1, 3)) as tnc:
+        frames = asyncio.run(asyncio.wait_for(run(tnc.address), 5))
+    # The echoed TX delay command is skipped
+    assert frames == [(2, b'one\xC0'), (0, b'two'), (0, b'three')]
+    assert all(type(data) is bytearray for (_, data) in frames)
+
+
+def test_iteration_ends_when_closed():
+    async def run(address):
+        connection = kiss.AsyncConnection()
+        await connection.connect_to_server(*address)
+        try:
+            return [frame async for frame in connection]
+        finally:
+            await connection.disconnect_from_server()
+
+    with FakeTnc(Mode.GENERATE, count=20, ports=(1,)) as tnc:
+        frames = asyncio.run(asyncio.wait_for(run(tnc.address), 5))
+    assert len(frames) == 20
+    assert {port for (port, _) in frames} == {1}
@@ -0,0 +1,96 @@
+# =============================================================================
+# Copyright (c) 2024 Martin F N Cooper
+#
+# Author: Martin F N Cooper
+# License: MIT License
+# =============================================================================
+
+import threading
+
+import kiss
+from kiss.transport import Transport
+
+
+class _RecordingTransport(Transport):
+    def __init__(self):
+        self.writes = []
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def write(self, data):
+        self.writes.append(bytes(data))
+
+    def frames(self, write):
+        return [(port, command, bytes(payload)) for (port, command, payload)
+                in kiss.Decoder().feed(self.writes[write])]
+
+
+def _connect():
+    transport = _RecordingTransport()
+    connection = kiss.Connection(None)
+    connection.connect(transport)
+    return (connection, transport)
+
+
+def test_send_many_writes_once():
+    (connection, transport) = _connect()
+    connection.send_many([b'one', b'', b'two\xC0'], port=3)
+    assert len(transport.writes) == 1
+    assert transport.frames(0) == [(3, 0, b'one'), (3, 0, b'two\xC0')]
+    connection.disconnect_from_server()
+
+
+def test_batch_writes_once_at_end():
+    (connection, transport) = _connect()
+    with connection.batch():
+        connection.set_tx_delay(30)
+        connection.send_data(b'one')
+        with connection.batch():
+            connection.send_many([b'two', b'three'])
+        assert transport.writes == []
+    assert len(transport.writes) == 1
+    assert transport.frames(0) == [
+        (0, kiss.Command.TX_DELAY.value, bytes([30])),
+        (0, 0, b'one'), (0, 0, b'two'), (0, 0, b'three')]
+    connection.disconnect_from_server()
+
+
+def test_batch_is_per_thread():
+    (connection, transport) = _connect()
+    with connection.batch():
+        connection.send_data(b'batched')
+        thread = threading.Thread(
+            target=connection.send_data, args=(b'other thread',))
+        thread.start()
+        thread.join()
+        # Written at once, without waiting for the batch
+        assert len(transport.writes) == 1
+    assert [transport.frames(i) for i in range(2)] == [
+        [(0, 0, b'other thread')], [(0, 0, b'batched')]]
+    connection.disconnect_from_server()
+
+
+def test_concurrent_batches_kept_apart():
+    (connection, transport) = _connect()
+
+    def send(name):
+        for _ in range(50):
+            with connection.batch():
+                connection.send_data(name + b'1')
+                connection.send_data(name + b'2')
+    threads = [threading.Thread(target=send, args=(b'%d' % i,))
+               for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(transport.writes) == 200
+    for i in range(200):
+        [(_, _, first), (_, _, second)] = transport.frames(i)
+        assert (first[:-1], first[-1:], second) == (
+            second[:-1], b'1', first[:-1] + b'2')
+    connection.disconnect_from_server()
@@ -0,0 +1,85 @@
+# =============================================================================
+# Copyright (c) 2024 Martin F N Cooper
+#
+# Author: Martin F N Cooper
+# License: MIT License
+# =============================================================================
+
+import pickle
+import random
+
+import pytest
+
+import kiss
+from kiss import bulk
+
+
+def _stream(rng, count):
+    # Special characters are frequent, including runs of FESC and invalid or
+    # incomplete escape sequences, as are empty frames
+    alphabet = b'\xC0\xDB\xDB\xDB\xDC\xDDab'
+    data = bytearray()
+    for _ in range(count):
+        data += bytes(rng.choice(alphabet) for _ in range(rng.randint(0, 12)))
+    return bytes(data)
+
+
+def _frames(frames):
+    return [(port, command, bytes(data)) for (port, command, data) in frames]
+
+
+def _decoded(data):
+    # What a Decoder provides, for comparison
+    decoder = kiss.Decoder()
+    frames = _frames(decoder.feed(data))
+    return (frames, len(data) - decoder.pending)
+
+
+def _columns(frames):
+    return (list(frames.ports), list(frames.commands), list(frames.offsets),
+            list(frames.lengths), bytes(frames.payloads), frames.consumed)
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_python_matches_decoder(seed):
+    data = _stream(random.Random(seed), 100)
+    frames = bulk._decode_python(data, False)
+    assert (_frames(frames), frames.consumed) == _decoded(data)
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_numpy_matches_python(seed):
+    pytest.importorskip('numpy')
+    data = _stream(random.Random(seed), 100)
+    assert _columns(bulk._decode_numpy(data, False)) == _columns(
+        bulk._decode_python(data, False))
+
+
+@pytest.mark.parametrize('data', [
+    b'', b'no fend', b'\xC0\xC0', b'\x10only\xC0', b'\xC0\x00a\xDB\xC0',
+    b'\xC0\x00\xDB\xDB\xDB\xDC\xC0partial'])
+def test_edge_cases(data):
+    expected = _decoded(data)
+    frames = bulk._decode_python(data, False)
+    assert (_frames(frames), frames.consumed) == expected
+    if bulk.numpy is not None:
+        frames = bulk._decode_numpy(data, False)
+        assert (_frames(frames), frames.consumed) == expected
+
+
+@pytest.mark.parametrize('data', [b'\xC0\x00a\xDBx\xC0', b'\xC0\x00a\xDB\xC0'])
+def test_strict(data):
+    decoders = [bulk._decode_python]
+    if bulk.numpy is not None:
+        decoders.append(bulk._decode_numpy)
+    for decode in decoders:
+        with pytest.raises(ValueError):
+            decode(data, True)
+
+
+def test_frames_access_and_pickle():
+    data = b'\xC0\x10one\xC0\x2Ctwo\xDB\xDC\xC0'
+    frames = bulk.decode(memoryview(data))
+    assert len(frames) == 2
+    assert _frames([frames[1]]) == [(2, 12, b'two\xC0')]
+    assert _frames(pickle.loads(pickle.dumps(frames))) == _frames(frames)
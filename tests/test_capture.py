@@ -0,0 +1,119 @@
+# =============================================================================
+# Copyright (c) 2024 Martin F N Cooper
+#
+# Author: Martin F N Cooper
+# License: MIT License
+# =============================================================================
+
+import pytest
+
+import kiss
+from kiss.capture import (CaptureReader, CaptureWriter, RawReader, RawWriter,
+                          open_reader)
+
+_FRAMES = [(100.0, 0, b'plain'), (101.0, 1, b'esc\xC0\xDBaped'),
+           (102.0, 15, b'x' * 1000)]
+
+
+def _write(writer_class, path):
+    with writer_class(path) as writer:
+        for (timestamp, port, data) in _FRAMES:
+            writer.write(port, data, timestamp)
+        writer.write(2, bytes([30]), 103.0, kiss.Command.TX_DELAY)
+
+
+def _data(frames):
+    return [(port, command, bytes(data)) for (port, command, data) in frames]
+
+
+@pytest.fixture
+def capture(tmp_path):
+    path = str(tmp_path / 'test.kcap')
+    _write(CaptureWriter, path)
+    return path
+
+
+@pytest.fixture
+def raw(tmp_path):
+    path = str(tmp_path / 'test.kiss')
+    _write(RawWriter, path)
+    return path
+
+
+_EXPECTED = [(port, 0, data) for (_, port, data) in _FRAMES] + [
+    (2, kiss.Command.TX_DELAY.value, bytes([30]))]
+
+
+def test_capture_round_trip(capture):
+    with CaptureReader(capture) as reader:
+        frames = list(reader)
+        assert [timestamp for (timestamp, _, _, _) in frames] == [
+            100.0, 101.0, 102.0, 103.0]
+        assert _data(frame[1:] for frame in frames) == _EXPECTED
+        assert len(reader) == 4
+        assert bytes(reader[1][3]) == b'esc\xC0\xDBaped'
+        assert _data(f[1:] for f in reader.frames(1, 3)) == _EXPECTED[1:3]
+        assert reader.find(101.5) == 2
+        assert reader.find(200) == 4
+
+
+def test_capture_appended(capture):
+    with CaptureWriter(capture) as writer:
+        writer.write(0, b'more', 104.0)
+    with CaptureReader(capture) as reader:
+        assert len(reader) == 5
+
+
+def test_incomplete_record_ignored(capture):
+    with open(capture, 'ab') as f:
+        f.write(b'\0' * 7)
+    with CaptureReader(capture) as reader:
+        assert len(list(reader)) == 4
+    with open(capture, 'r+b') as f:
+        f.truncate(f.seek(0, 2) - 10)
+    with CaptureReader(capture) as reader:
+        assert len(list(reader)) == 3
+
+
+def test_raw_round_trip(raw):
+    with RawReader(raw) as reader:
+        assert _data(reader) == _EXPECTED
+        assert len(reader) == 4
+        assert bytes(reader[2][2]) == b'x' * 1000
+        assert _data(reader.frames(3)) == _EXPECTED[3:]
+
+
+def test_views_only_where_unescaped(capture, raw):
+    for reader in (CaptureReader(capture), RawReader(raw)):
+        with reader:
+            types = [type(frame[-1]) for frame in reader]
+            assert types == [memoryview, bytearray, memoryview, memoryview]
+
+
+def test_open_reader(capture, raw, tmp_path):
+    with open_reader(capture) as reader:
+        assert isinstance(reader, CaptureReader)
+    with open_reader(raw) as reader:
+        assert isinstance(reader, RawReader)
+    empty = tmp_path / 'empty'
+    empty.write_bytes(b'')
+    with open_reader(str(empty)) as reader:
+        assert list(reader) == []
+
+
+def test_not_a_capture_file(raw):
+    with pytest.raises(ValueError):
+        CaptureReader(raw)
+    with pytest.raises(ValueError):
+        CaptureWriter(raw)
+
+
+def test_strict(tmp_path):
+    path = str(tmp_path / 'bad.kiss')
+    with open(path, 'wb') as f:
+        f.write(b'\xC0\x00bad\xDBx\xC0')
+    with RawReader(path) as reader:
+        assert _data(reader) == [(0, 0, b'badx')]
+    with RawReader(path, strict=True) as reader:
+        with pytest.raises(ValueError):
+            list(reader)
@@ -0,0 +1,50 @@
+# =============================================================================
+# Copyright (c) 2024 Martin F N Cooper
+#
+# Author: Martin F N Cooper
+# License: MIT License
+# =============================================================================
+
+import pytest
+
+from kiss import codec
+
+
+@pytest.mark.parametrize('data', [
+    b'\xDB\xDC',          # Literal FESC TFEND, not an escaped FEND
+    b'\xDB\xDD',          # Literal FESC TFESC, not an escaped FESC
+    b'\xC0\xDB\xDC\xDD',
+    b'\xDB\xDB\xDC\xC0',
+])
+def test_round_trip_of_escape_lookalikes(data):
+    assert bytes(codec.decode(codec.encode(data))) == data
+
+
+def test_decode_is_single_pass():
+    # An escaped FESC followed by TFEND must not become FEND
+    assert bytes(codec.decode(b'\xDB\xDD\xDC')) == b'\xDB\xDC'
+
+
+def test_strict_rejects_invalid_escape():
+    with pytest.raises(ValueError):
+        codec.decode(b'a\xDBx', strict=True)
+    assert bytes(codec.decode(b'a\xDBx')) == b'ax'
+
+
+def test_encode_escapes_fesc_before_fend():
+    assert codec.encode(b'\xC0\xDB') == b'\xDB\xDC\xDB\xDD'
+
+
+@pytest.mark.parametrize('data', [b'plain', b'a\xC0b\xDBc'])
+def test_encode_memoryview(data):
+    expected = codec.encode(data)
+    assert codec.encode(memoryview(data)) == expected
+    out = bytearray(b'>')
+    assert codec.encode(memoryview(data), out) is out
+    assert out == b'>' + expected
+
+
+def test_no_copy_without_special_characters():
+    data = b'plain'
+    assert codec.encode(data) is data
+    assert codec.decode(data) is data
@@ -0,0 +1,71 @@
+# =============================================================================
+# Copyright (c) 2024 Martin F N Cooper
+#
+# Author: Martin F N Cooper
+# License: MIT License
+# =============================================================================
+
+import queue
+import time
+
+import pytest
+
+import kiss
+from kiss.testing import FakeTnc, Mode
+
+
+def test_kiss_exception_is_an_exception():
+    assert issubclass(kiss.KissException, Exception)
+    try:
+        raise kiss.KissException('test')
+    except Exception as e:
+        assert str(e) == 'test'
+
+
+def test_handled_commands():
+    # Echoed commands arrive just as replies from a TNC would
+    (frames, handled) = (queue.Queue(), queue.Queue())
+    with FakeTnc(Mode.ECHO) as tnc:
+        connection = kiss.Connection(
+            lambda port, data: frames.put((port, bytes(data))))
+        connection.handle(kiss.Command.SET_HARDWARE,
+                          lambda port, command, data: handled.put(
+                              (port, command, bytes(data))))
+        connection.connect_to_server(*tnc.address)
+        try:
+            connection.set_hardware(b'reply', port=4)
+            connection.send_data(b'data')
+            assert handled.get(timeout=5) == (
+                4, kiss.Command.SET_HARDWARE.value, b'reply')
+            assert frames.get(timeout=5) == (0, b'data')
+        finally:
+            connection.disconnect_from_server()
+    assert frames.empty()
+
+
+def test_unhandled_commands_dropped():
+    frames = queue.Queue()
+    stats = kiss.stats.Stats()
+    with FakeTnc(Mode.ECHO) as tnc:
+        connection = kiss.Connection(
+            lambda port, data: frames.put(bytes(data)), stats=stats)
+        connection.connect_to_server(*tnc.address)
+        try:
+            connection.set_tx_delay(30)
+            connection.set_persistence(63)
+            connection.send_data(b'data')
+            assert frames.get(timeout=5) == b'data'
+            deadline = time.monotonic() + 5
+            while stats.illegal_frames < 2 and time.monotonic() < deadline:
+                time.sleep(0.01)
+        finally:
+            connection.disconnect_from_server()
+    assert stats.illegal_frames == 2
+    assert frames.empty()
+
+
+def test_invalid_command():
+    connection = kiss.Connection(None)
+    for command in (0, 16):
+        with pytest.raises(ValueError):
+            connection.handle(command, None)
@@ -0,0 +1,56 @@
+# =============================================================================
+# Copyright (c) 2024 Martin F N Cooper
+#
+# Author: Martin F N Cooper
+# License: MIT License
+# =============================================================================
+
+import pytest
+
+import kiss
+
+
+def test_frames_split_across_feeds():
+    decoder = kiss.Decoder()
+    assert list(decoder.feed(b'\xC0\x10hel')) == []
+    assert decoder.pending == 4
+    assert list(decoder.feed(b'lo\xC0\xC0\x00\xDB\xDCx\xC0')) == [
+        (1, 0, b'hello'), (0, 0, b'\xC0x')]
+    assert decoder.pending == 0
+
+
+def test_frames_kept_when_fed_again_before_iterating():
+    decoder = kiss.Decoder()
+    first = decoder.feed(b'\xC0\x00hello\xC0')
+    second = decoder.feed(b'\xC0\x00WORLD\xC0')
+    assert list(first) == [(0, 0, b'hello')]
+    assert list(second) == [(0, 0, b'WORLD')]
+
+
+def test_payloads_are_bytearrays_unless_views():
+    frame = b'\xC0\x00hello\xC0'
+    [(_, _, payload)] = kiss.Decoder().feed(frame)
+    assert type(payload) is bytearray
+    [(_, _, payload)] = kiss.Decoder(views=True).feed(frame)
+    assert type(payload) is memoryview
+
+
+def test_read_into_writable_space():
+    decoder = kiss.Decoder(size=4)
+    data = b'\xC0\x20' + b'x' * 100 + b'\xC0'
+    space = decoder.writable(len(data))
+    space[:len(data)] = data
+    assert list(decoder.commit(len(data))) == [(2, 0, b'x' * 100)]
+
+
+def test_strict_rejects_invalid_escape():
+    with pytest.raises(ValueError):
+        list(kiss.Decoder(strict=True).feed(b'\xC0\x00a\xDBx\xC0'))
+
+
+def test_encoder_round_trip():
+    encoder = kiss.Encoder()
+    buffer = encoder.encode(b'\xC0\xDB', port=3)
+    encoder.encode_many([b'one', b'two'], port=1, out=buffer)
+    assert list(kiss.Decoder().feed(buffer)) == [
+        (3, 0, b'\xC0\xDB'), (1, 0, b'one'), (1, 0, b'two')]
@@ -0,0 +1,69 @@
+# =============================================================================
+# Copyright (c) 2024 Martin F N Cooper
+#
+# Author: Martin F N Cooper
+# License: MIT License
+# =============================================================================
+
+import random
+
+import pytest
+
+from kiss import _Deframer
+
+
+def _stream(frames):
+    return b''.join(b'\xC0' + frame + b'\xC0' for frame in frames)
+
+
+def test_empty_frames_skipped():
+    deframer = _Deframer()
+    assert deframer.feed(b'\xC0\xC0\xC0\x00one\xC0\xC0\x00two\xC0') == [
+        b'\x00one', b'\x00two']
+
+
+def test_data_before_first_fend_is_a_frame():
+    assert _Deframer().feed(b'\x00one\xC0') == [b'\x00one']
+
+
+def test_partial_frame_kept():
+    deframer = _Deframer()
+    assert deframer.feed(b'\xC0\x00one\xC0\xC0\x00tw') == [b'\x00one']
+    assert deframer.pending == 3
+    assert deframer.feed(b'o\xC0') == [b'\x00two']
+    assert deframer.pending == 0
+
+
+@pytest.mark.parametrize('views', [False, True])
+def test_random_pieces(views):
+    # Small buffer, so that it is both compacted and grown along the way
+    rng = random.Random(1)
+    frames = [bytes(rng.randrange(0xC0) for _ in range(rng.randint(1, 300)))
+              for _ in range(200)]
+    data = _stream(frames)
+    deframer = _Deframer(64, views)
+    received = []
+    pos = 0
+    while pos < len(data):
+        size = rng.randint(1, 100)
+        received.extend(bytes(frame)
+                        for frame in deframer.feed(data[pos:pos + size]))
+        pos += size
+    assert received == frames
+
+
+def test_read_into_writable_space():
+    deframer = _Deframer(8)
+    data = _stream([b'\x00' + bytes(50)])
+    space = deframer.writable(len(data))
+    assert len(space) >= len(data)
+    space[:len(data)] = data
+    assert deframer.commit(len(data)) == [b'\x00' + bytes(50)]
+
+
+def test_reset_discards_partial_frame():
+    deframer = _Deframer()
+    deframer.feed(b'\xC0\x00partial')
+    deframer.reset()
+    assert deframer.pending == 0
+    assert deframer.feed(b'\x00whole\xC0') == [b'\x00whole']
@@ -0,0 +1,103 @@
+# =============================================================================
+# Copyright (c) 2024 Martin F N Cooper
+#
+# Author: Martin F N Cooper
+# License: MIT License
+# =============================================================================
+
+import concurrent.futures
+import queue
+import random
+import threading
+import time
+
+import kiss
+from kiss.testing import FakeTnc, Mode
+
+
+def _wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_executor_keeps_order_for_each_port():
+    rng = random.Random(1)
+    lock = threading.Lock()
+    received = {port: [] for port in range(3)}
+
+    def callback(port, data):
+        time.sleep(rng.random() / 1000)
+        with lock:
+            received[port].append(bytes(data))
+    sent = {port: [b'%d:%d' % (port, i) for i in range(50)]
+            for port in range(3)}
+    with concurrent.futures.ThreadPoolExecutor(4) as executor:
+        with FakeTnc(Mode.ECHO) as tnc:
+            connection = kiss.Connection(callback, executor=executor,
+                                         frame_views=True)
+            connection.connect_to_server(*tnc.address)
+            try:
+                for i in range(50):
+                    for port in range(3):
+                        connection.send_data(sent[port][i], port=port)
+                assert _wait_for(lambda: sum(map(len, received.values()))
+                                 == 150)
+            finally:
+                connection.disconnect_from_server()
+    assert received == sent
+
+
+def test_queue_receives_copies():
+    frames = queue.Queue()
+    with FakeTnc(Mode.ECHO) as tnc:
+        connection = kiss.Connection(None, executor=frames, frame_views=True)
+        connection.connect_to_server(*tnc.address)
+        try:
+            connection.send_many([b'one', b'two'], port=1)
+            received = [frames.get(timeout=5) for _ in range(2)]
+        finally:
+            connection.disconnect_from_server()
+    assert received == [(1, b'one'), (1, b'two')]
+    assert {type(data) for (_, data) in received} == {bytearray}
+
+
+def test_full_queue_drops():
+    frames = queue.Queue(2)
+    stats = kiss.stats.Stats()
+    with FakeTnc(Mode.ECHO) as tnc:
+        connection = kiss.Connection(frames, stats=stats,
+                                     dispatch_overflow=kiss.Overflow.DROP)
+        connection.connect_to_server(*tnc.address)
+        try:
+            connection.send_many([b'%d' % i for i in range(10)])
+            assert _wait_for(lambda: stats.frames_received == 10)
+        finally:
+            connection.disconnect_from_server()
+    assert [frames.get_nowait() for _ in range(2)] == [(0, b'0'), (0, b'1')]
+    assert frames.empty()
+
+
+def test_max_pending_drops():
+    release = threading.Event()
+    received = []
+
+    def callback(port, data):
+        release.wait(5)
+        received.append(bytes(data))
+    stats = kiss.stats.Stats()
+    with concurrent.futures.ThreadPoolExecutor(1) as executor:
+        with FakeTnc(Mode.ECHO) as tnc:
+            connection = kiss.Connection(
+                callback, executor=executor, max_pending=3, stats=stats,
+                dispatch_overflow=kiss.Overflow.DROP)
+            connection.connect_to_server(*tnc.address)
+            try:
+                connection.send_many([b'%d' % i for i in range(10)])
+                assert _wait_for(lambda: stats.frames_received == 10)
+                release.set()
+                assert _wait_for(lambda: len(received) == 3)
+            finally:
+                connection.disconnect_from_server()
+    assert received == [b'0', b'1', b'2']
@@ -0,0 +1,88 @@
+# =============================================================================
+# Copyright (c) 2024 Martin F N Cooper
+#
+# Author: Martin F N Cooper
+# License: MIT License
+# =============================================================================
+
+import queue
+import socket
+import threading
+
+import kiss
+from kiss.testing import FakeTnc, Mode
+from kiss.transport import _SocketTransport
+
+
+class _PairTransport(_SocketTransport):
+    # One end of a socket pair, the other end standing in for a TNC
+    def __init__(self):
+        super().__init__()
+        self.peer = None
+
+    def _create_socket(self):
+        (sock, self.peer) = socket.socketpair()
+        return sock
+
+
+def test_frames_from_many_connections():
+    received = queue.Queue()
+
+    def handler(connection, port, data):
+        received.put((connection, bytes(data)))
+    hub = kiss.Hub(handler)
+    with FakeTnc(Mode.ECHO) as tnc:
+        connections = [kiss.Connection(None, hub=hub) for _ in range(3)]
+        for connection in connections:
+            connection.connect_to_server(*tnc.address)
+        try:
+            for (i, connection) in enumerate(connections):
+                connection.send_data(b'frame %d' % i)
+            results = {received.get(timeout=5) for _ in connections}
+        finally:
+            for connection in connections:
+                connection.disconnect_from_server()
+            hub.close()
+    assert results == {(connection, b'frame %d' % i)
+                       for (i, connection) in enumerate(connections)}
+
+
+def test_callback_disconnects_another_connection():
+    # Both connections become readable while the hub is held up in another
+    # callback, so that the one disconnected is still among those selected
+    hub = kiss.Hub()
+    (held, release) = (threading.Event(), threading.Event())
+    received = queue.Queue()
+
+    def hold(port, data):
+        held.set()
+        release.wait(5)
+    gate = kiss.Connection(hold, hub=hub)
+    gate.connect(_PairTransport())
+    for _ in range(30):
+        other = kiss.Connection(lambda port, data: None, hub=hub)
+
+        def disconnect_other(port, data):
+            other.disconnect_from_server()
+            received.put(data)
+        first = kiss.Connection(disconnect_other, hub=hub)
+        transports = (_PairTransport(), _PairTransport())
+        for (connection, transport) in zip((first, other), transports):
+            connection.connect(transport)
+        held.clear()
+        release.clear()
+        gate._transport.peer.sendall(b'\xC0\x00gate\xC0')
+        assert held.wait(5)
+        for transport in transports:
+            transport.peer.sendall(b'\xC0\x00data\xC0')
+        release.set()
+        assert received.get(timeout=5) == b'data'
+        # Allow the hub to continue with the other selected sockets; if its
+        # thread has died, disconnecting would wait for it forever
+        hub._thread.join(0.05)
+        assert hub._thread.is_alive()
+        first.disconnect_from_server()
+        for transport in transports:
+            transport.peer.close()
+    gate.disconnect_from_server()
+    hub.close()
@@ -0,0 +1,67 @@
+# =============================================================================
+# Copyright (c) 2024 Martin F N Cooper
+#
+# Author: Martin F N Cooper
+# License: MIT License
+# =============================================================================
+
+import random
+
+import pytest
+
+from kiss import bulk, parallel
+from kiss.capture import RawWriter
+
+
+@pytest.fixture
+def raw(tmp_path):
+    rng = random.Random(1)
+    path = str(tmp_path / 'test.kiss')
+    with RawWriter(path) as writer:
+        for _ in range(2000):
+            data = bytes(rng.choice(b'\xC0\xDBabc')
+                         for _ in range(rng.randint(1, 40)))
+            writer.write(rng.randrange(16), data)
+    return path
+
+
+def _frames(chunks):
+    return [(port, command, bytes(data))
+            for frames in chunks for (port, command, data) in frames]
+
+
+def _expected(path):
+    with open(path, 'rb') as f:
+        return _frames([bulk.decode(f.read())])
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+@pytest.mark.parametrize('chunk_size', [1000, 100000])
+def test_same_as_bulk(raw, workers, chunk_size):
+    assert _frames(parallel.decode_file(
+        raw, workers=workers, chunk_size=chunk_size)) == _expected(raw)
+
+
+def test_chunks_end_at_fend(raw):
+    chunks = parallel._split_file(raw, 1000)
+    assert len(chunks) > 10
+    with open(raw, 'rb') as f:
+        data = f.read()
+    assert chunks[0][0] == 0
+    assert chunks[-1][1] == len(data)
+    for ((_, end), (start, _)) in zip(chunks, chunks[1:]):
+        assert end == start
+        assert data[end - 1:end] == b'\xC0'
+
+
+def test_empty_file(tmp_path):
+    path = tmp_path / 'empty.kiss'
+    path.write_bytes(b'')
+    assert list(parallel.decode_file(str(path), workers=2)) == []
+
+
+def test_invalid_arguments(raw):
+    with pytest.raises(ValueError):
+        parallel.decode_file(raw, workers=0)
+    with pytest.raises(ValueError):
+        parallel.decode_file(raw, chunk_size=0)
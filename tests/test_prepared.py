@@ -0,0 +1,77 @@
+# =============================================================================
+# Copyright (c) 2024 Martin F N Cooper
+#
+# Author: Martin F N Cooper
+# License: MIT License
+# =============================================================================
+
+import pytest
+
+import kiss
+from kiss import _FrameCache
+from kiss.transport import Transport
+
+
+class _RecordingTransport(Transport):
+    def __init__(self):
+        self.data = bytearray()
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def write(self, data):
+        self.data.extend(data)
+
+    def frames(self):
+        return [(port, command, bytes(payload)) for (port, command, payload)
+                in kiss.Decoder().feed(self.data)]
+
+
+def test_prepared_frame():
+    connection = kiss.Connection(None)
+    prepared = connection.prepare(bytearray(b'beacon\xC0'), port=2)
+    assert (prepared.port, prepared.data) == (2, b'beacon\xC0')
+    assert prepared.frame == kiss.Encoder().encode(b'beacon\xC0', port=2)
+    with pytest.raises(ValueError):
+        connection.prepare(b'')
+
+
+def test_send_prepared_on_any_connection():
+    prepared = kiss.Connection(None).prepare(b'beacon', port=1)
+    for _ in range(2):
+        transport = _RecordingTransport()
+        connection = kiss.Connection(None)
+        connection.connect(transport)
+        connection.send_prepared(prepared)
+        connection.send_prepared(prepared)
+        connection.disconnect_from_server()
+        assert transport.frames() == [(1, 0, b'beacon')] * 2
+
+
+def test_cached_frames_sent_unchanged():
+    transport = _RecordingTransport()
+    connection = kiss.Connection(None, encode_cache=1000)
+    connection.connect(transport)
+    for data in (b'one', b'two\xDB', b'one', b'two\xDB'):
+        connection.send_data(data, port=3)
+    connection.send_data(b'one', port=4)
+    connection.disconnect_from_server()
+    assert transport.frames() == [
+        (3, 0, b'one'), (3, 0, b'two\xDB'), (3, 0, b'one'),
+        (3, 0, b'two\xDB'), (4, 0, b'one')]
+
+
+def test_cache_reuses_and_evicts():
+    # Each frame is 13 bytes, so only two fit
+    cache = _FrameCache(30)
+    (one, two) = (b'0123456789', b'abcdefghij')
+    frame = cache.get(0, one)
+    assert cache.get(0, one) is frame
+    assert cache.get(1, one) is not frame
+    cache.get(0, two)
+    # The oldest was evicted to make room
+    assert cache.get(0, one) is not frame
+    assert len(cache.get(0, bytes(100))) == 103
@@ -0,0 +1,54 @@
+# =============================================================================
+# Copyright (c) 2024 Martin F N Cooper
+#
+# Author: Martin F N Cooper
+# License: MIT License
+# =============================================================================
+
+import queue
+
+import pytest
+
+import kiss
+from kiss.testing import FakeTnc, Mode
+
+
+@pytest.mark.parametrize('buffer_size', [16, 4096])
+def test_fragmented_frames(buffer_size):
+    # Frames are longer than the buffer, and split at random places
+    sent = [bytes([i]) * (100 + i) for i in range(1, 50)]
+    received = queue.Queue()
+    with FakeTnc(Mode.ECHO, fragment=(1, 40)) as tnc:
+        connection = kiss.Connection(
+            lambda port, data: received.put(bytes(data)),
+            buffer_size=buffer_size)
+        connection.connect_to_server(*tnc.address)
+        try:
+            connection.send_many(sent)
+            frames = [received.get(timeout=5) for _ in sent]
+        finally:
+            connection.disconnect_from_server()
+    assert frames == sent
+
+
+def test_frame_views():
+    received = queue.Queue()
+
+    def callback(port, data):
+        # A view is valid only until the callback returns
+        received.put((type(data), bytes(data)))
+    with FakeTnc(Mode.ECHO) as tnc:
+        connection = kiss.Connection(callback, frame_views=True)
+        connection.connect_to_server(*tnc.address)
+        try:
+            connection.send_many([b'plain', b'esc\xDBaped'])
+            frames = [received.get(timeout=5) for _ in range(2)]
+        finally:
+            connection.disconnect_from_server()
+    # Only a frame with escape sequences needs to be copied
+    assert frames == [(memoryview, b'plain'), (bytearray, b'esc\xDBaped')]
+
+
+def test_invalid_buffer_size():
+    with pytest.raises(ValueError):
+        kiss.Connection(None, buffer_size=0)
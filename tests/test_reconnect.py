@@ -0,0 +1,99 @@
+# =============================================================================
+# Copyright (c) 2024 Martin F N Cooper
+#
+# Author: Martin F N Cooper
+# License: MIT License
+# =============================================================================
+
+import itertools
+import queue
+import time
+
+import pytest
+
+import kiss
+from kiss.testing import FakeTnc, Mode
+
+_BACKOFF = kiss.Backoff(0.01, 0.05)
+
+
+def _wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_backoff_delays():
+    delays = list(itertools.islice(
+        kiss.Backoff(1, 5, jitter=0).delays(), 5))
+    assert delays == [1, 2, 4, 5, 5]
+    backoff = kiss.Backoff(1, factor=1, jitter=0.5)
+    for delay in itertools.islice(backoff.delays(), 50):
+        assert 0.5 <= delay <= 1
+    with pytest.raises(ValueError):
+        kiss.Backoff(2, 1)
+
+
+def test_reconnect_after_reset():
+    # The echoed frames show what the TNC receives on each connection
+    received = queue.Queue()
+    lost = []
+    stats = kiss.stats.Stats()
+    connection = kiss.Connection(
+        lambda port, data: received.put(bytes(data)), reconnect=_BACKOFF,
+        stats=stats, on_disconnect=lost.append)
+    connection.handle(kiss.Command.TX_DELAY,
+                      lambda port, command, data: received.put(bytes(data)))
+    with FakeTnc(Mode.ECHO, reset_after=2) as tnc:
+        connection.connect_to_server(*tnc.address)
+        try:
+            connection.set_tx_delay(30)
+            connection.send_data(b'one')
+            assert [received.get(timeout=5) for _ in range(2)] == [
+                bytes([30]), b'one']
+            # The TX delay is sent again once reconnected
+            assert received.get(timeout=5) == bytes([30])
+            assert _wait_for(
+                lambda: connection.state is kiss.State.CONNECTED)
+            connection.send_data(b'two')
+            assert received.get(timeout=5) == b'two'
+        finally:
+            connection.disconnect_from_server()
+    assert lost[0] is connection
+    assert stats.reconnects >= 1
+    assert connection.state is kiss.State.CLOSED
+
+
+def test_frames_held_while_down():
+    received = queue.Queue()
+    connection = kiss.Connection(
+        lambda port, data: received.put(bytes(data)), reconnect=_BACKOFF)
+    tnc = FakeTnc(Mode.ECHO)
+    tnc.start()
+    address = tnc.address
+    connection.connect_to_server(*address)
+    try:
+        tnc.stop()
+        assert _wait_for(lambda: connection.state is kiss.State.CONNECTING)
+        connection.send_data(b'held')
+        # Started again on the same port, as for a TNC that was restarted
+        with FakeTnc(Mode.ECHO, port=address[1]):
+            assert received.get(timeout=5) == b'held'
+            assert connection.state is kiss.State.CONNECTED
+            connection.disconnect_from_server()
+    finally:
+        connection.disconnect_from_server()
+
+
+def test_disconnect_while_reconnecting():
+    tnc = FakeTnc(Mode.SINK)
+    tnc.start()
+    connection = kiss.Connection(None, reconnect=_BACKOFF)
+    connection.connect_to_server(*tnc.address)
+    tnc.stop()
+    assert _wait_for(lambda: connection.state is kiss.State.CONNECTING)
+    start = time.monotonic()
+    connection.disconnect_from_server()
+    assert time.monotonic() - start < 1
+    assert connection.state is kiss.State.CLOSED
@@ -0,0 +1,76 @@
+# =============================================================================
+# Copyright (c) 2024 Martin F N Cooper
+#
+# Author: Martin F N Cooper
+# License: MIT License
+# =============================================================================
+
+import queue
+import time
+
+import pytest
+
+import kiss
+from kiss.capture import CaptureReader, CaptureWriter
+from kiss.replay import Replay, ReplayServer
+
+# The second frame needs decoding, so is not a view of the file
+_FRAMES = [(100.0, 0, b'plain'), (100.1, 1, b'esc\xC0aped'),
+           (100.2, 0, b'last')]
+
+
+@pytest.fixture
+def capture(tmp_path):
+    path = str(tmp_path / 'test.kcap')
+    with CaptureWriter(path) as writer:
+        for (timestamp, port, data) in _FRAMES:
+            writer.write(port, data, timestamp)
+        writer.write(0, bytes([30]), 100.3, kiss.Command.TX_DELAY)
+    with CaptureReader(path) as reader:
+        yield reader
+
+
+def test_replay_to_callback(capture):
+    received = []
+    replay = Replay(capture, speed=0)
+    replay.add(lambda port, data: received.append((port, bytes(data))))
+    replay.run()
+    assert received == [(port, data) for (_, port, data) in _FRAMES]
+    assert replay.frames_replayed == 4
+
+
+def test_replay_to_connection(capture):
+    received = []
+    connection = kiss.Connection(
+        lambda port, data: received.append((port, data)))
+    replay = Replay(capture, speed=0)
+    replay.add(connection)
+    replay.run()
+    assert received == [(port, data) for (_, port, data) in _FRAMES]
+    # As for frames received from a TNC, unless views are wanted
+    assert {type(data) for (_, data) in received} == {bytearray}
+
+
+def test_replay_timing(capture):
+    times = []
+    replay = Replay(capture, speed=2)
+    replay.add(lambda port, data: times.append(time.monotonic()))
+    replay.run()
+    # Frames 0.1 seconds apart, replayed twice as fast
+    assert 0.08 < times[-1] - times[0] < 0.5
+
+
+def test_replay_server(capture):
+    frames = queue.Queue()
+    with ReplayServer() as server:
+        connection = kiss.Connection(frames)
+        connection.connect_to_server(*server.address)
+        try:
+            assert server.wait_for_clients(1, 5)
+            replay = Replay(capture, speed=0)
+            replay.add(server)
+            replay.run()
+            received = [frames.get(timeout=5) for _ in _FRAMES]
+        finally:
+            connection.disconnect_from_server()
+    assert received == [(port, data) for (_, port, data) in _FRAMES]
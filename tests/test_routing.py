@@ -0,0 +1,75 @@
+# =============================================================================
+# Copyright (c) 2024 Martin F N Cooper
+#
+# Author: Martin F N Cooper
+# License: MIT License
+# =============================================================================
+
+import queue
+import threading
+
+import pytest
+
+import kiss
+from kiss.testing import FakeTnc, Mode
+
+
+def test_received_port_is_high_nibble():
+    frames = queue.Queue()
+    with FakeTnc(Mode.GENERATE, count=5, ports=(3,)) as tnc:
+        connection = kiss.Connection(frames)
+        connection.connect_to_server(*tnc.address)
+        try:
+            ports = {frames.get(timeout=5)[0] for _ in range(5)}
+        finally:
+            connection.disconnect_from_server()
+    assert ports == {3}
+
+
+def test_sent_port_is_high_nibble():
+    received = []
+    with FakeTnc(Mode.ECHO) as tnc:
+        done = threading.Event()
+
+        def callback(port, data):
+            received.append((port, bytes(data)))
+            done.set()
+        connection = kiss.Connection(callback)
+        connection.connect_to_server(*tnc.address)
+        try:
+            connection.send_data(b'data', port=5)
+            assert done.wait(5)
+        finally:
+            connection.disconnect_from_server()
+    assert received == [(5, b'data')]
+
+
+def test_routes():
+    (default, routed) = (queue.Queue(), queue.Queue())
+    with FakeTnc(Mode.ECHO) as tnc:
+        connection = kiss.Connection(
+            lambda port, data: default.put((port, bytes(data))))
+        connection.route(2, routed)
+        connection.route(3, lambda port, data: routed.put((port, data)))
+        connection.connect_to_server(*tnc.address)
+        try:
+            for port in range(4):
+                connection.send_data(b'%d' % port, port=port)
+            assert sorted(routed.get(timeout=5) for _ in range(2)) == [
+                (2, b'2'), (3, b'3')]
+            assert [default.get(timeout=5) for _ in range(2)] == [
+                (0, b'0'), (1, b'1')]
+            # Removing a route restores the original destination
+            connection.route(2, None)
+            connection.send_data(b'again', port=2)
+            assert default.get(timeout=5) == (2, b'again')
+        finally:
+            connection.disconnect_from_server()
+    assert routed.empty()
+
+
+def test_route_port_out_of_range():
+    connection = kiss.Connection(None)
+    for port in (-1, kiss.MAX_PORTS):
+        with pytest.raises(ValueError):
+            connection.route(port, None)
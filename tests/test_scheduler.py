@@ -0,0 +1,99 @@
+# =============================================================================
+# Copyright (c) 2024 Martin F N Cooper
+#
+# Author: Martin F N Cooper
+# License: MIT License
+# =============================================================================
+
+import threading
+import time
+
+import kiss
+from kiss.transport import Transport
+
+
+class _GatedTransport(Transport):
+    # Holds up the first write until released, so that frames accumulate in
+    # the send queue meanwhile
+    def __init__(self):
+        self.data = bytearray()
+        self.writing = threading.Event()
+        self.release = threading.Event()
+
+    def open(self):
+        pass
+
+    def close(self):
+        self.release.set()
+
+    def write(self, data):
+        self.writing.set()
+        self.release.wait(5)
+        self.data.extend(data)
+
+    def frames(self):
+        return [(port, command, bytes(payload)) for (port, command, payload)
+                in kiss.Decoder().feed(self.data)]
+
+
+def _connect(**kwargs):
+    transport = _GatedTransport()
+    connection = kiss.Connection(None, **kwargs)
+    connection.connect(transport)
+    # Once the first frame is being written, the rest wait in the queue
+    connection.send_data(b'first')
+    assert transport.writing.wait(5)
+    return (connection, transport)
+
+
+def _disconnect(connection, transport):
+    transport.release.set()
+    connection.disconnect_from_server()
+    return transport.frames()
+
+
+def test_frames_written_in_order_of_priority():
+    (connection, transport) = _connect(send_queue=10, scheduled=True)
+    connection.send_data(b'bulk', priority=kiss.Priority.BULK)
+    connection.send_data(b'interactive')
+    connection.set_tx_delay(30)
+    assert _disconnect(connection, transport) == [
+        (0, 0, b'first'),
+        (0, kiss.Command.TX_DELAY.value, bytes([30])),
+        (0, 0, b'interactive'),
+        (0, 0, b'bulk')]
+
+
+def test_ports_served_in_turn():
+    (connection, transport) = _connect(send_queue=10, scheduled=True)
+    for (port, data) in ((0, b'a1'), (0, b'a2'), (1, b'b1'), (0, b'a3')):
+        connection.send_data(data, port=port)
+    assert [(port, data) for (port, _, data)
+            in _disconnect(connection, transport)[1:]] == [
+        (0, b'a1'), (1, b'b1'), (0, b'a2'), (0, b'a3')]
+
+
+def test_expired_frames_discarded():
+    (connection, transport) = _connect(send_queue=10, scheduled=True,
+                                       stats=True)
+    connection.send_data(b'expires', max_age=0.01)
+    connection.send_data(b'kept', max_age=60)
+    time.sleep(0.05)
+    assert _disconnect(connection, transport) == [
+        (0, 0, b'first'), (0, 0, b'kept')]
+    assert connection.stats.expired_frames == 1
+
+
+def test_commands_not_dropped_when_full():
+    (connection, transport) = _connect(
+        send_queue=2, scheduled=True, send_overflow=kiss.Overflow.DROP)
+    for i in range(5):
+        connection.send_data(b'bulk %d' % i, priority=kiss.Priority.BULK)
+    assert connection.send_queue_depth == 2
+    connection.set_tx_delay(30)
+    assert connection.send_queue_depth == 3
+    assert _disconnect(connection, transport) == [
+        (0, 0, b'first'),
+        (0, kiss.Command.TX_DELAY.value, bytes([30])),
+        (0, 0, b'bulk 0'),
+        (0, 0, b'bulk 1')]
@@ -0,0 +1,134 @@
+# =============================================================================
+# Copyright (c) 2024 Martin F N Cooper
+#
+# Author: Martin F N Cooper
+# License: MIT License
+# =============================================================================
+
+import queue
+import socket
+import threading
+import time
+
+import pytest
+
+import kiss
+from kiss.testing import FakeTnc, Mode
+from kiss.transport import Transport, _SocketTransport
+
+
+class _GatedTransport(Transport):
+    # Holds up writes until released, as for a TNC that is slow to read
+    def __init__(self):
+        self.data = bytearray()
+        self.writing = threading.Event()
+        self.release = threading.Event()
+        self.closed = False
+
+    def open(self):
+        pass
+
+    def close(self):
+        self.closed = True
+        self.release.set()
+
+    def write(self, data):
+        self.writing.set()
+        self.release.wait()
+        if self.closed:
+            raise OSError('Closed')
+        self.data.extend(data)
+
+    def frames(self):
+        return [bytes(payload) for (_, _, payload)
+                in kiss.Decoder().feed(self.data)]
+
+
+class _PairTransport(_SocketTransport):
+    # One end of a socket pair, whose other end is never read
+    def _create_socket(self):
+        (sock, self.peer) = socket.socketpair()
+        return sock
+
+
+def _connect(**kwargs):
+    transport = _GatedTransport()
+    connection = kiss.Connection(None, send_queue=4, **kwargs)
+    connection.connect(transport)
+    # Once the first frame is being written, the rest wait in the queue
+    connection.send_data(b'first')
+    assert transport.writing.wait(5)
+    return (connection, transport)
+
+
+def test_large_frames_written_whole():
+    frames = [bytes([i]) * 200000 for i in range(1, 6)]
+    with FakeTnc(Mode.SINK) as tnc:
+        connection = kiss.Connection(None, send_queue=2)
+        connection.connect_to_server(*tnc.address)
+        for data in frames:
+            connection.send_data(data)
+        connection.disconnect_from_server()
+        deadline = time.monotonic() + 5
+        while tnc.frames_received < 5 and time.monotonic() < deadline:
+            time.sleep(0.01)
+    assert tnc.frames_received == 5
+    assert tnc.bytes_received == sum(len(data) + 3 for data in frames)
+
+
+def test_queue_drained_on_disconnect():
+    (connection, transport) = _connect()
+    for i in range(4):
+        connection.send_data(b'%d' % i)
+    assert connection.send_queue_depth == 4
+    transport.release.set()
+    connection.disconnect_from_server()
+    assert transport.frames() == [b'first', b'0', b'1', b'2', b'3']
+
+
+def test_drop_until_low_water():
+    (connection, transport) = _connect(send_overflow=kiss.Overflow.DROP)
+    for i in range(6):
+        connection.send_data(b'%d' % i)
+    assert connection.send_queue_depth == 4
+    transport.release.set()
+    connection.disconnect_from_server()
+    assert transport.frames() == [b'first', b'0', b'1', b'2', b'3']
+
+
+def test_raise_when_full():
+    (connection, transport) = _connect(send_overflow=kiss.Overflow.RAISE)
+    for i in range(4):
+        connection.send_data(b'%d' % i)
+    with pytest.raises(queue.Full):
+        connection.send_data(b'4')
+    transport.release.set()
+    connection.disconnect_from_server()
+
+
+def test_block_until_low_water():
+    (connection, transport) = _connect()
+    for i in range(4):
+        connection.send_data(b'%d' % i)
+    sender = threading.Thread(target=connection.send_data, args=(b'4',))
+    sender.start()
+    sender.join(0.1)
+    assert sender.is_alive()
+    transport.release.set()
+    sender.join(5)
+    assert not sender.is_alive()
+    connection.disconnect_from_server()
+    assert transport.frames()[-1] == b'4'
+
+
+def test_disconnect_bounded_when_tnc_not_reading():
+    connection = kiss.Connection(None, send_queue=100)
+    transport = _PairTransport()
+    connection.connect(transport)
+    for _ in range(100):
+        connection.send_data(bytes(100000))
+    start = time.monotonic()
+    connection.disconnect_from_server(drain_timeout=0.2)
+    assert time.monotonic() - start < 2
+    assert connection.state is kiss.State.CLOSED
+    transport.peer.close()
@@ -0,0 +1,91 @@
+# =============================================================================
+# Copyright (c) 2024 Martin F N Cooper
+#
+# Author: Martin F N Cooper
+# License: MIT License
+# =============================================================================
+
+import socket
+import threading
+import time
+
+import pytest
+
+import kiss
+from kiss.testing import FakeTnc, Mode
+from kiss.transport import Transport
+
+
+class _GatedTransport(Transport):
+    # Holds up writes until released, so that disconnecting must drain
+    def __init__(self):
+        self.writing = threading.Event()
+        self.release = threading.Event()
+
+    def open(self):
+        pass
+
+    def close(self):
+        self.release.set()
+
+    def write(self, data):
+        self.writing.set()
+        self.release.wait(5)
+
+
+def test_lifecycle():
+    connection = kiss.Connection(None, send_queue=4)
+    assert connection.state is kiss.State.CLOSED
+    transport = _GatedTransport()
+    connection.connect(transport)
+    assert connection.state is kiss.State.CONNECTED
+    connection.send_data(b'data')
+    assert transport.writing.wait(5)
+    disconnect = threading.Thread(target=connection.disconnect_from_server)
+    disconnect.start()
+    disconnect.join(0.1)
+    assert connection.state is kiss.State.DRAINING
+    assert not connection.wait_closed(0)
+    transport.release.set()
+    assert connection.wait_closed(5)
+    disconnect.join()
+
+
+def test_failed_connect():
+    # A port that nothing is listening on
+    with socket.socket() as sock:
+        sock.bind(('localhost', 0))
+        port = sock.getsockname()[1]
+    connection = kiss.Connection(None)
+    with pytest.raises(OSError):
+        connection.connect_to_server('localhost', port)
+    assert connection.state is kiss.State.CLOSED
+
+
+def test_receiver_stops_at_eof():
+    # The server closes the connection once its frames have been sent
+    with FakeTnc(Mode.GENERATE, count=1) as tnc:
+        connection = kiss.Connection(lambda port, data: None)
+        connection.connect_to_server(*tnc.address)
+        assert connection.wait_closed(5)
+        receiver = connection._receiver
+        start = time.process_time()
+        time.sleep(0.2)
+        # A receiver spinning at EOF would use the CPU all this time
+        assert time.process_time() - start < 0.1
+        assert receiver is None or not receiver.is_alive()
+        connection.disconnect_from_server()
+    assert connection.state is kiss.State.CLOSED
+
+
+def test_write_failure_closes():
+    with FakeTnc(Mode.SINK) as tnc:
+        connection = kiss.Connection(None)
+        connection.connect_to_server(*tnc.address)
+    # With nothing received, the loss is noticed when writing fails
+    with pytest.raises(OSError):
+        for _ in range(100):
+            connection.send_data(bytes(10000))
+            time.sleep(0.01)
+    assert connection.state is kiss.State.CLOSED
+    connection.disconnect_from_server()
@@ -0,0 +1,75 @@
+# =============================================================================
+# Copyright (c) 2024 Martin F N Cooper
+#
+# Author: Martin F N Cooper
+# License: MIT License
+# =============================================================================
+
+import time
+
+import kiss
+from kiss.stats import Histogram, Stats
+from kiss.testing import FakeTnc, Mode
+
+
+def test_histogram():
+    histogram = Histogram((1, 2, 5))
+    assert histogram.quantile(0.5) is None
+    for value in (0.5, 1.5, 1.5, 3, 10):
+        histogram.observe(value)
+    assert histogram.counts == [1, 2, 1, 1]
+    assert histogram.count == 5
+    assert histogram.sum == 16.5
+    assert histogram.quantile(0.5) == 2
+    assert histogram.quantile(0.99) == float('inf')
+    histogram.reset()
+    assert histogram.count == 0
+
+
+def test_connection_counters():
+    stats = Stats()
+    with FakeTnc(Mode.ECHO) as tnc:
+        connection = kiss.Connection(lambda port, data: None, stats=stats)
+        connection.connect_to_server(*tnc.address)
+        try:
+            connection.send_data(b'one\xC0', port=2)
+            connection.send_data(b'two')
+            deadline = time.monotonic() + 5
+            while stats.frames_received < 2 and time.monotonic() < deadline:
+                time.sleep(0.01)
+        finally:
+            connection.disconnect_from_server()
+    assert connection.stats is stats
+    assert (stats.frames_sent, stats.frames_received) == (2, 2)
+    # Each frame has two FENDs and a command byte, and one FEND is escaped
+    assert stats.bytes_sent == stats.bytes_received == 8 + 6
+    assert stats.escapes_sent == stats.escapes_received == 1
+    assert stats.port_frames_sent[2] == stats.port_frames_received[2] == 1
+    assert stats.port_bytes_received[0] == 3
+    assert stats.callback_latency.count == 2
+    assert stats.dispatch_latency.count == 2
+
+
+def test_no_stats_by_default():
+    assert kiss.Connection(None).stats is None
+    assert isinstance(kiss.Connection(None, stats=True).stats, Stats)
+
+
+def test_export():
+    stats = Stats()
+    stats.frames_sent = 3
+    stats.port_frames_sent[1] = 3
+    stats.callback_latency.observe(0.002)
+    snapshot = stats.snapshot()
+    assert snapshot['frames_sent'] == 3
+    assert snapshot['port_frames_sent'][1] == 3
+    assert snapshot['callback_latency']['count'] == 1
+    reported = {}
+    stats.report(lambda name, value, labels: reported.setdefault(
+        (name, tuple(labels.items())), value))
+    assert reported[('frames_sent', ())] == 3
+    assert reported[('port_frames_sent', (('port', 1),))] == 3
+    assert ('port_frames_sent', (('port', 0),)) not in reported
+    assert reported[('callback_latency_count', ())] == 1
+    stats.reset()
+    assert stats.snapshot()['frames_sent'] == 0
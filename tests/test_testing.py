@@ -0,0 +1,79 @@
+# =============================================================================
+# Copyright (c) 2024 Martin F N Cooper
+#
+# Author: Martin F N Cooper
+# License: MIT License
+# =============================================================================
+
+import socket
+import time
+
+import pytest
+
+import kiss
+from kiss.testing import FakeTnc, Mode
+
+
+def _receive_all(address):
+    # Returns all frames sent by the server before it closes the connection
+    decoder = kiss.Decoder()
+    frames = []
+    with socket.create_connection(address) as sock:
+        while True:
+            data = sock.recv(65536)
+            if not data:
+                return frames
+            frames.extend(decoder.feed(data))
+
+
+def test_generated_frames_repeatable():
+    def generate():
+        with FakeTnc(Mode.GENERATE, count=50, sizes=(1, 10), ports=(1, 2),
+                     fragment=(1, 5), seed=7) as tnc:
+            frames = _receive_all(tnc.address)
+            assert tnc.frames_sent == 50
+            return frames
+    frames = generate()
+    assert len(frames) == 50
+    assert {port for (port, _, _) in frames} == {1, 2}
+    assert all(1 <= len(data) <= 10 for (_, _, data) in frames)
+    assert generate() == frames
+
+
+def test_rate():
+    with FakeTnc(Mode.GENERATE, count=10, rate=100) as tnc:
+        start = time.monotonic()
+        _receive_all(tnc.address)
+        assert time.monotonic() - start >= 0.08
+
+
+def test_sink_counts():
+    with FakeTnc(Mode.SINK) as tnc:
+        with socket.create_connection(tnc.address) as sock:
+            sock.sendall(kiss.Encoder().encode_many([b'one', b'two']))
+            deadline = time.monotonic() + 5
+            while tnc.frames_received < 2 and time.monotonic() < deadline:
+                time.sleep(0.01)
+        assert tnc.frames_received == 2
+        assert tnc.bytes_received == 12
+
+
+def test_reset_after():
+    with FakeTnc(Mode.ECHO, reset_after=2) as tnc:
+        with socket.create_connection(tnc.address) as sock:
+            sock.sendall(kiss.Encoder().encode_many([b'one', b'two']))
+            with pytest.raises(ConnectionResetError):
+                while sock.recv(65536):
+                    pass
+
+
+def test_stop_with_client_connected():
+    tnc = FakeTnc(Mode.ECHO)
+    tnc.start()
+    with socket.create_connection(tnc.address) as sock:
+        sock.sendall(b'\xC0\x00one\xC0')
+        assert sock.recv(65536)
+        start = time.monotonic()
+        tnc.stop()
+        assert time.monotonic() - start < 1
+        assert sock.recv(65536) == b''
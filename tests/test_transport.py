@@ -0,0 +1,118 @@
+# =============================================================================
+# Copyright (c) 2024 Martin F N Cooper
+#
+# Author: Martin F N Cooper
+# License: MIT License
+# =============================================================================
+
+import os
+import queue
+import socket
+import threading
+
+import pytest
+
+import kiss
+from kiss.transport import PtyTransport, SerialTransport, UnixTransport
+
+pytest.importorskip('termios')
+
+
+def _open_fds():
+    return len(os.listdir('/proc/self/fd'))
+
+
+def test_pty_loopback():
+    # A connection on each side of a pseudo-terminal, as for an application
+    # that talks to a serial TNC
+    (received, tnc_received) = (queue.Queue(), queue.Queue())
+    pty = PtyTransport()
+    connection = kiss.Connection(
+        lambda port, data: received.put((port, bytes(data))))
+    connection.connect(pty)
+    tnc = kiss.Connection(
+        lambda port, data: tnc_received.put((port, bytes(data))))
+    tnc.connect(SerialTransport(pty.name, None))
+    try:
+        connection.send_data(b'to tnc\xC0', port=1)
+        assert tnc_received.get(timeout=5) == (1, b'to tnc\xC0')
+        tnc.send_data(bytes(range(256)) * 20, port=2)
+        assert received.get(timeout=5) == (2, bytes(range(256)) * 20)
+    finally:
+        tnc.disconnect_from_server()
+        connection.disconnect_from_server()
+
+
+def test_close_wakes_reader():
+    pty = PtyTransport()
+    pty.open()
+    counts = []
+    reader = threading.Thread(
+        target=lambda: counts.append(pty.read_into(bytearray(100))))
+    reader.start()
+    reader.join(0.1)
+    assert reader.is_alive()
+    pty.close()
+    reader.join(5)
+    assert counts == [0]
+    # Writing once closed fails, rather than using a stale descriptor
+    with pytest.raises(OSError):
+        pty.write(b'data')
+
+
+def test_reopen_pty():
+    pty = PtyTransport()
+    for _ in range(2):
+        pty.open()
+        assert os.path.exists(pty.name)
+        pty.close()
+
+
+@pytest.mark.skipif(not os.path.isdir('/proc/self/fd'),
+                    reason='Requires /proc')
+def test_failed_open_leaks_nothing(tmp_path):
+    # A regular file can be opened, but is not a terminal
+    path = tmp_path / 'not_a_tty'
+    path.write_bytes(b'')
+    transport = SerialTransport(str(path))
+    before = _open_fds()
+    for _ in range(10):
+        with pytest.raises(OSError):
+            transport.open()
+        with pytest.raises(OSError):
+            SerialTransport(str(tmp_path / 'missing')).open()
+    assert _open_fds() == before
+
+
+def test_unsupported_baud_rate():
+    with pytest.raises(ValueError):
+        SerialTransport('/dev/null', 12345)
+
+
+def test_unix_socket(tmp_path):
+    path = str(tmp_path / 'tnc.sock')
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(path)
+    listener.listen()
+
+    def echo():
+        (sock, _) = listener.accept()
+        with sock:
+            while True:
+                data = sock.recv(1024)
+                if not data:
+                    break
+                sock.sendall(data)
+    server = threading.Thread(target=echo, daemon=True)
+    server.start()
+    received = queue.Queue()
+    connection = kiss.Connection(
+        lambda port, data: received.put((port, bytes(data))))
+    connection.connect(UnixTransport(path))
+    try:
+        connection.send_data(b'echo', port=3)
+        assert received.get(timeout=5) == (3, b'echo')
+    finally:
+        connection.disconnect_from_server()
+        server.join(5)
+        listener.close()